@@ -0,0 +1,156 @@
+"""
+Non-interactive (batch) entry point for the analysis
+
+Runs the analysis steps for many experiments in parallel (one process per experiment).
+Each experiment is given either as
+- an experiment folder with a configurations.txt file (the analysis runs inside that folder) or
+- a configurations file (the analysis runs in the current folder).
+
+Nothing is asked from the user. The exclusion step uses an existing excluded_cells.txt
+file (if it does not exist no cells are excluded). Output of every experiment is written
+to results/{EXPERIMENT_NAME}/batch_log.txt and timing and status of every step to
+results/{EXPERIMENT_NAME}/batch_manifest.json
+
+Example:
+python batch_run.py experiments/islet_1 experiments/islet_2 configs/islet_3.txt --workers 4
+"""
+# pylint: disable=W0703, W0718, C0413
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import freeze_support
+import matplotlib
+#batch mode never shows figures
+matplotlib.use('Agg')
+from methods.islet import Islet
+from helper_functions.utility_functions import set_interactive, validate_config_data, complete_config_data
+
+#Islet methods of the analysis steps (same numbers as in run.py)
+BATCH_STEPS = {
+    2: 'filter_traces',
+    3: 'smooth_traces',
+    4: 'binarize_traces',
+    5: 'exclude_traces',
+    6: 'corr_coact_analysis',
+    7: 'cell_activity_analysis',
+    8: 'wave_anaylsis'
+}
+
+
+def read_experiment_configs(experiment: str, base_folder: str) -> tuple:
+    """
+    Returns the working folder and configurations of an experiment
+    (experiment folder or configurations file)
+    """
+    working_folder = base_folder
+    config_path = experiment
+    if os.path.isdir(experiment):
+        working_folder = os.path.abspath(experiment)
+        config_path = os.path.join(experiment, 'configurations.txt')
+    with open(config_path, encoding='utf-8') as file:
+        config_data = json.load(file)
+    return working_folder, config_data
+
+
+def run_experiment(experiment: str, steps: list, base_folder: str) -> dict:
+    """
+    Runs all steps of one experiment and writes its manifest.
+    Configurations files are run in base_folder
+    """
+    set_interactive(False)
+    manifest = {'experiment': experiment, 'status': 'ok', 'steps': []}
+    start_time = time.time()
+    try:
+        working_folder, config_data = read_experiment_configs(experiment, base_folder)
+        #fields added in later versions get their default values
+        added_fields = complete_config_data(config_data)
+        if added_fields:
+            manifest['added_config_fields'] = added_fields
+        if not validate_config_data(config_data):
+            raise ValueError('Configurations have missing or unknown fields.')
+        os.chdir(working_folder)
+        manifest['experiment_name'] = config_data['EXPERIMENT_NAME']
+        results_folder = f'results/{config_data["EXPERIMENT_NAME"]}'
+        if not os.path.exists(results_folder):
+            os.makedirs(results_folder)
+    except Exception as err:
+        manifest['status'] = 'failed'
+        manifest['error'] = repr(err)
+        manifest['seconds'] = round(time.time() - start_time, 3)
+        return manifest
+
+    islet = Islet()
+    islet.configs = config_data
+    with open(f'{results_folder}/batch_log.txt', 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log):
+        for step in ['load_data'] + [BATCH_STEPS[step] for step in steps]:
+            step_start = time.time()
+            step_manifest = {'step': step, 'status': 'ok'}
+            try:
+                getattr(islet, step)()
+            #steps raise BaseException for invalid configurations
+            except BaseException as err:
+                if isinstance(err, KeyboardInterrupt):
+                    raise
+                traceback.print_exc(file=log)
+                step_manifest['status'] = 'failed'
+                step_manifest['error'] = repr(err)
+            step_manifest['seconds'] = round(time.time() - step_start, 3)
+            manifest['steps'].append(step_manifest)
+            if step_manifest['status'] == 'failed':
+                manifest['status'] = 'failed'
+                break
+            if step == 'load_data' and islet.raw_data is None:
+                step_manifest['status'] = manifest['status'] = 'failed'
+                step_manifest['error'] = 'Raw data not found or not valid.'
+                break
+
+    manifest['seconds'] = round(time.time() - start_time, 3)
+    with open(f'{results_folder}/batch_manifest.json', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def main():
+    """
+    Parses command line arguments and runs all experiments
+    """
+    parser = argparse.ArgumentParser(description='Runs the analysis for many experiments.')
+    parser.add_argument('experiments', nargs='+',
+                        help='experiment folders (with configurations.txt) or configurations files')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of experiments analyzed in parallel')
+    parser.add_argument('--steps', type=int, nargs='+', default=list(BATCH_STEPS),
+                        choices=list(BATCH_STEPS), help='analysis steps (as in run.py)')
+    parser.add_argument('--manifest', default='batch_manifest.json',
+                        help='summary manifest of all experiments')
+    args = parser.parse_args()
+    steps = sorted(set(args.steps))
+    #relative experiment paths are resolved before worker processes change folders
+    experiments = [os.path.abspath(experiment) for experiment in args.experiments]
+
+    manifests = []
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = [executor.submit(run_experiment, experiment, steps, os.getcwd())
+                   for experiment in experiments]
+        for future in as_completed(futures):
+            manifest = future.result()
+            manifests.append(manifest)
+            print(f'{manifest["status"].upper()} {manifest["experiment"]} ({manifest["seconds"]} s) ' +
+                  f'[{len(manifests)}/{len(experiments)}]')
+
+    with open(args.manifest, 'w', encoding='utf-8') as file:
+        json.dump(manifests, file, indent=2)
+    failed = [manifest for manifest in manifests if manifest['status'] != 'ok']
+    print(f'Finished. {len(manifests)-len(failed)} experiments succeeded, {len(failed)} failed.')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    freeze_support()
+    main()
@@ -0,0 +1,131 @@
+"""
+Binary storage of preprocessing artifacts (filtered, smoothed, binarized traces...)
+
+Raw data text files are parsed once and cached in a binary .npy sidecar.
+Artifacts are saved as .npy files (bit-packed binarized traces as uncompressed
+.npz files) and memory-mapped back on load. Text (.txt) files are an optional export and
+are only read if no binary file of the artifact exists (older experiment folders).
+"""
+import os
+import glob
+import struct
+import zipfile
+import uuid
+import numpy as np
+from helper_functions.packed_binary import PackedBinary
+
+
+def save_artifact(CONFIG_DATA: dict, path: str, data, fmt: str):
+    """
+    Saves artifact to path (without extension) as .npy (.npz for PackedBinary data).
+    Also writes a text export (.txt) with the given format if EXPORT_TEXT_FILES is true.
+    """
+    # pylint: disable-next=C0103
+    EXPORT_TEXT_FILES = CONFIG_DATA['EXPORT_TEXT_FILES']
+    if isinstance(data, PackedBinary):
+        replace_file(f'{path}.npz', lambda file: np.savez(file, packed=data.packed, frames=data.frames))
+        remove_file(f'{path}.npy')
+    else:
+        replace_file(f'{path}.npy', lambda file: np.save(file, np.asarray(data)))
+        remove_file(f'{path}.npz')
+
+    if EXPORT_TEXT_FILES:
+        np.savetxt(f'{path}.txt', data, fmt=fmt)
+
+
+def load_artifact(path: str) -> tuple:
+    """
+    Loads artifact saved under path (without extension).
+    .npy files are memory-mapped (copy-on-write, so in-place changes stay in memory),
+    .npz files are loaded as PackedBinary with memory-mapped bits (see load_packed)
+    and .txt files are parsed as a fallback.
+    Returns the data and the loaded file name or (None, None) if no file exists.
+    """
+    if os.path.exists(f'{path}.npy'):
+        return np.load(f'{path}.npy', mmap_mode='c'), f'{path}.npy'
+    if os.path.exists(f'{path}.npz'):
+        return load_packed(f'{path}.npz'), f'{path}.npz'
+    if os.path.exists(f'{path}.txt'):
+        return np.loadtxt(f'{path}.txt'), f'{path}.txt'
+    return None, None
+
+
+def load_packed(path: str) -> PackedBinary:
+    """
+    Loads a PackedBinary saved as .npz file. The packed bits are memory-mapped
+    (copy-on-write) from the uncompressed .npz file, so frames are only read from
+    disk when they are indexed (e.g. chunk by chunk). Other files are loaded to memory.
+    """
+    header_readers = {(1, 0): np.lib.format.read_array_header_1_0,
+                      (2, 0): np.lib.format.read_array_header_2_0}
+    with np.load(path) as file:
+        frames = int(file['frames'])
+        info = file.zip.getinfo('packed.npy')
+        if info.compress_type != zipfile.ZIP_STORED:
+            return PackedBinary(file['packed'], frames)
+        with open(path, 'rb') as raw_file:
+            #data of a zip member starts after its local header (30 bytes, name and extra field)
+            raw_file.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', raw_file.read(30)[26:30])
+            raw_file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(raw_file)
+            if version not in header_readers:
+                return PackedBinary(file['packed'], frames)
+            shape, fortran_order, dtype = header_readers[version](raw_file)
+            offset = raw_file.tell()
+    if 0 in shape:
+        return PackedBinary(np.zeros(shape, dtype), frames)
+    packed = np.memmap(path, dtype=dtype, mode='c', offset=offset, shape=shape,
+                       order='F' if fortran_order else 'C')
+    return PackedBinary(packed, frames)
+
+
+def load_raw_data(path: str) -> np.ndarray:
+    """
+    Loads the raw data text file at path.
+    The parsed matrix is cached in a .npy sidecar next to the text file. The sidecar
+    name contains the size and modification time of the text file, so a changed
+    text file is parsed again. Cached data is memory-mapped read-only.
+    """
+    stat = os.stat(path)
+    sidecar = f'{path}.{stat.st_size}_{stat.st_mtime_ns}.npy'
+    if os.path.exists(sidecar):
+        return np.load(sidecar, mmap_mode='r')
+
+    raw_data = np.loadtxt(path)
+    try:
+        replace_file(sidecar, lambda file: np.save(file, raw_data))
+    except OSError:
+        #raw data folder is not writable, data is parsed on every load
+        return raw_data
+    for old_sidecar in glob.glob(f'{glob.escape(path)}.*_*.npy'):
+        if old_sidecar != sidecar:
+            remove_file(old_sidecar)
+    return np.load(sidecar, mmap_mode='r')
+
+
+def replace_file(path: str, write):
+    """
+    Writes a file with write(file) to a temporary file with a unique name (next to path)
+    and then replaces path with it. Replacing (unlike overwriting) keeps
+    memory-mapped copies of the previous file valid, and processes writing the same
+    file at the same time never write to the same temporary file.
+    """
+    temporary_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(temporary_path, 'xb') as file:
+            write(file)
+        os.replace(temporary_path, path)
+    except BaseException:
+        remove_file(temporary_path)
+        raise
+
+
+def remove_file(path: str):
+    """
+    Removes file if it exists (also if it is removed by another process at the same time)
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,232 @@
+"""
+Rendering of per-cell diagnostic figures (filtered, smoothed and binarized traces)
+
+Figures are rendered after the numeric part of a step is finished, optionally
+in a pool of worker processes. Every worker builds one (Agg) figure per layout
+and re-uses it for all cells by only updating the data of its line artists.
+Cells are saved either as one figure per cell ('single') or tiled
+CELLS_PER_PAGE cells per page into one multi-page PDF file ('pdf') or
+large-grid PNG sheets ('sheets'). Files of all steps are named the same
+way (see FIGURE_FILES) and old figures in the figure folder of a step are
+removed before rendering.
+
+A layout describes the figure of one cell:
+{
+    'name': unique name of the layout,
+    'folder': figure folder of the step,
+    'file': name of the figure file of one cell with a {cell} placeholder ('single' mode),
+    'panels': [{
+        'title': panel title (may contain a {cell} placeholder),
+        'xlabel': x axis label, 'ylabel': y axis label,
+        'xlim': (start, end) or None,
+        'lines': [(series name, color, linewidth), ...],
+        'hline': (value name, color, linewidth) or None
+    }, ...],
+    'hspace': vertical space between panels,
+    'savefig': keyword arguments of savefig
+}
+Series are (frames, cells) matrices and values are (cells,) vectors (one value per cell).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from helper_functions.utility_functions import print_progress_bar
+from helper_functions.parallel import column_shards
+# pylint: disable-next=W0611
+from methods import plot_configurations
+
+CELL_FIGURE_MODES = ['single', 'pdf', 'sheets', 'none']
+#Size (in inches) of one cell (width) and of one panel of a cell (height) on pages
+PAGE_CELL_WIDTH = 4.0
+PAGE_PANEL_HEIGHT = 1.1
+PAGE_DPI = 100
+#Names of page files in the figure folder of a step
+FIGURE_FILES = {'pdf': 'cells.pdf', 'sheets': 'cells_{first}-{last}.png'}
+
+#Figures (and their artists) of the current process, reused for all cells/pages
+_FIGURES = {}
+
+
+def _setup_panel(ax, panel: dict) -> tuple:
+    """
+    Adds empty line artists and labels of a panel to ax
+    """
+    lines = [ax.plot([], [], color=color, linewidth=linewidth)[0]
+             for _, color, linewidth in panel['lines']]
+    hline = None
+    if panel.get('hline'):
+        _, color, linewidth = panel['hline']
+        hline = ax.axhline(0, color=color, linewidth=linewidth)
+    ax.set_xlabel(panel.get('xlabel', ''))
+    ax.set_ylabel(panel.get('ylabel', ''))
+    return ax, lines, hline
+
+
+def _build_figure(layout: dict) -> tuple:
+    """
+    Creates the figure of a layout (one cell) with empty line artists
+    """
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(len(layout['panels']), 1, squeeze=False)[:, 0]
+    artists = [_setup_panel(ax, panel) for ax, panel in zip(axes, layout['panels'])]
+    fig.subplots_adjust(hspace=layout['hspace'])
+    return fig, [artists]
+
+
+def _build_page(layout: dict, cells_per_page: int) -> tuple:
+    """
+    Creates a page figure with a grid of cells_per_page cell layouts.
+    Every cell occupies one column slot with all panels of the layout stacked.
+    """
+    panel_num = len(layout['panels'])
+    columns = int(np.ceil(np.sqrt(cells_per_page)))
+    rows = int(np.ceil(cells_per_page/columns))
+    fig = Figure(figsize=(PAGE_CELL_WIDTH*columns, PAGE_PANEL_HEIGHT*panel_num*rows))
+    FigureCanvasAgg(fig)
+    grid = fig.add_gridspec(rows*panel_num, columns)
+    slots = []
+    for slot in range(cells_per_page):
+        row, column = divmod(slot, columns)
+        slots.append([_setup_panel(fig.add_subplot(grid[row*panel_num+i, column]), panel)
+                      for i, panel in enumerate(layout['panels'])])
+    fig.subplots_adjust(left=0.05, right=0.98, bottom=0.04, top=0.97,
+                        hspace=1.5*layout['hspace']+0.5, wspace=0.3)
+    return fig, slots
+
+
+def _draw_cell(layout: dict, artists: list, time: np.ndarray, series: dict,
+               values: dict, column: int, cell: int, label_cell: bool = False):
+    """
+    Updates the artists of one cell layout with the data of one cell.
+    With label_cell the cell number is added to the first panel title.
+    """
+    for i, ((ax, lines, hline), panel) in enumerate(zip(artists, layout['panels'])):
+        title = panel.get('title', '')
+        if label_cell and i == 0 and '{cell}' not in title:
+            title = f'Cell {{cell}}: {title}' if title else 'Cell {cell}'
+        ax.set_title(title.format(cell=cell))
+        for line, (name, _, _) in zip(lines, panel['lines']):
+            line.set_data(time, series[name][:, column])
+        if hline is not None:
+            value = values[panel['hline'][0]][column]
+            hline.set_ydata([value, value])
+        ax.relim()
+        ax.autoscale_view()
+        if panel.get('xlim') is not None:
+            ax.set_xlim(panel['xlim'])
+
+
+def render_cells(layout: dict, time: np.ndarray, series: dict, values: dict,
+                 cells: list, mode: str = 'single', cells_per_page: int = 1) -> int:
+    """
+    Renders and saves figures of the given cells (columns of series/values).
+    In 'pdf' and 'sheets' mode cells are tiled cells_per_page per page.
+    """
+    if mode == 'single':
+        key = layout['name']
+        if key not in _FIGURES:
+            _FIGURES[key] = _build_figure(layout)
+        fig, (artists,) = _FIGURES[key]
+        for column, cell in enumerate(cells):
+            _draw_cell(layout, artists, time, series, values, column, cell)
+            fig.savefig(os.path.join(layout['folder'], layout['file'].format(cell=cell)),
+                        **layout['savefig'])
+        return len(cells)
+
+    key = (layout['name'], cells_per_page)
+    if key not in _FIGURES:
+        _FIGURES[key] = _build_page(layout, cells_per_page)
+    fig, slots = _FIGURES[key]
+    pages = range(0, len(cells), cells_per_page)
+    pdf = None
+    if mode == 'pdf':
+        pdf = PdfPages(os.path.join(layout['folder'], FIGURE_FILES['pdf']))
+    try:
+        for page_start in pages:
+            page_cells = cells[page_start:page_start+cells_per_page]
+            for slot, artists in enumerate(slots):
+                visible = slot < len(page_cells)
+                for ax, _, _ in artists:
+                    ax.set_visible(visible)
+                if visible:
+                    _draw_cell(layout, artists, time, series, values, page_start+slot,
+                               page_cells[slot], label_cell=True)
+            if pdf is not None:
+                pdf.savefig(fig)
+            else:
+                sheet_file = FIGURE_FILES['sheets'].format(first=page_cells[0], last=page_cells[-1])
+                fig.savefig(os.path.join(layout['folder'], sheet_file), dpi=PAGE_DPI)
+    finally:
+        if pdf is not None:
+            pdf.close()
+    return len(cells)
+
+
+def clear_folder(folder: str):
+    """
+    Removes all files of folder (figures of an earlier run of the step)
+    """
+    if not os.path.isdir(folder):
+        return
+    for entry in os.scandir(folder):
+        if entry.is_file():
+            os.remove(entry.path)
+
+
+def render_cell_figures(CONFIG_DATA: dict, layout: dict, time, series: dict,
+                        values: dict = None, prefix: str = 'Plotting time series'):
+    """
+    Renders per-cell figures of a step according to CELL_FIGURES
+    ('single': one figure per cell, 'pdf': multi-page PDF, 'sheets': PNG pages
+    with CELLS_PER_PAGE cells per page, 'none': no figures).
+    Files of an earlier run are removed from the figure folder first.
+    With NUM_WORKERS > 1 figures are rendered in a pool of worker processes,
+    except in 'pdf' mode (one PDF file is written by a single process).
+    """
+    # pylint: disable=C0103
+    CELL_FIGURES = CONFIG_DATA['CELL_FIGURES']
+    CELLS_PER_PAGE = max(1, int(CONFIG_DATA['CELLS_PER_PAGE']))
+    NUM_WORKERS = CONFIG_DATA['NUM_WORKERS']
+    if CELL_FIGURES not in CELL_FIGURE_MODES:
+        # pylint: disable-next=W0719
+        raise BaseException('Please select a valid cell figure mode (CELL_FIGURES).')
+    clear_folder(layout['folder'])
+    if CELL_FIGURES == 'none':
+        return
+
+    values = values if values is not None else {}
+    time = np.asarray(time, float)
+    cell_num = next(iter(series.values())).shape[1]
+    cells_per_page = CELLS_PER_PAGE if CELL_FIGURES != 'single' else 1
+    #shards contain whole pages, the PDF file is written in one shard (by this process)
+    page_num = int(np.ceil(cell_num/cells_per_page))
+    if CELL_FIGURES == 'pdf':
+        NUM_WORKERS = 1
+        shards = [(0, cell_num)]
+    else:
+        shards = [(start*cells_per_page, min(stop*cells_per_page, cell_num)) for start, stop
+                  in column_shards(page_num, max(1, NUM_WORKERS))]
+    done = 0
+
+    def shard_args(start: int, stop: int) -> tuple:
+        return (layout, time,
+                {name: np.asarray(data[:, start:stop]) for name, data in series.items()},
+                {name: np.asarray(data[start:stop]) for name, data in values.items()},
+                list(range(start, stop)), CELL_FIGURES, cells_per_page)
+
+    if NUM_WORKERS <= 1:
+        for start, stop in shards:
+            done += render_cells(*shard_args(start, stop))
+            print_progress_bar(done, cell_num, prefix)
+        return
+
+    with ProcessPoolExecutor(max_workers=NUM_WORKERS) as executor:
+        futures = [executor.submit(render_cells, *shard_args(start, stop))
+                   for start, stop in shards]
+        for future in as_completed(futures):
+            done += future.result()
+            print_progress_bar(done, cell_num, prefix)
@@ -23,3 +23,53 @@ def find_clusters(cell_array, trigger_val: int = 1, stopind_inclusive: bool = Tr
 
     # Using a stepsize of 2 would get us start and stop indices for each island
     return list(zip(idx[:-1:2], idx[1::2]-int(stopind_inclusive))), lens
+
+def find_matrix_clusters(binarized_array: np.ndarray, trigger_val: int = 1) -> tuple:
+    """
+    Finds clusters of trigger value in all columns (cells) of a 2-D array
+    (frames x cells) with one difference of the padded boolean matrix.
+    Returns cells, start indices and lengths of clusters (ordered by cell and start).
+    """
+    frame_num, cell_num = np.shape(binarized_array)
+    # cells x frames with False "sentinels" on both sides of every cell
+    padded = np.zeros((cell_num, frame_num+2), bool)
+    padded[:, 1:-1] = (np.asarray(binarized_array) == trigger_val).T
+    # shifts alternate between starts and stops of clusters of every cell
+    shifts = np.flatnonzero(np.diff(padded, axis=1))
+    cells, starts = np.divmod(shifts[::2], frame_num+1)
+    return cells, starts, shifts[1::2] - shifts[::2]
+
+def activity_parameters(binarized_array: np.ndarray, sampling: float, interval_seconds: float) -> dict:
+    """
+    Relative active times, oscillation frequencies, average oscillation durations and
+    interoscillation interval variabilities (IOIV) of all cells (columns) of a binarized array.
+    Frequencies and durations of cells without oscillations and IOIV of cells with
+    less than 3 intervals of inactivity are nan.
+    """
+    cell_num = binarized_array.shape[1]
+    active = np.asarray(binarized_array) == 1
+    relative_active_times = np.sum(active, axis=0)/len(active)
+
+    cells, _, lengths = find_matrix_clusters(active, True)
+    osc_num = np.bincount(cells, minlength=cell_num)
+    osc_durations = np.bincount(cells, lengths, minlength=cell_num)
+    frequencies = np.full(cell_num, np.nan)
+    avg_durations = np.full(cell_num, np.nan)
+    oscillating = osc_num > 0
+    frequencies[oscillating] = osc_num[oscillating]/interval_seconds
+    avg_durations[oscillating] = osc_durations[oscillating]/osc_num[oscillating]/sampling
+
+    cells, _, lengths = find_matrix_clusters(active, False)
+    int_num = np.bincount(cells, minlength=cell_num)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_intervals = np.bincount(cells, lengths, minlength=cell_num)/int_num
+        int_std = np.sqrt(np.bincount(cells, (lengths-avg_intervals[cells])**2, minlength=cell_num)/int_num)
+    ioiv = np.full(cell_num, np.nan)
+    variable = int_num > 2
+    ioiv[variable] = (int_std[variable]/sampling)/(avg_intervals[variable]/sampling)
+    return {
+        'relative_active_times': relative_active_times,
+        'oscillation_frequencies': frequencies,
+        'avg_oscillation_durations': avg_durations,
+        'interoscillation_int_var': ioiv
+    }
@@ -4,26 +4,65 @@ Module for coactivity calculation
 
 import numpy as np
 from helper_functions.utility_functions import print_progress_bar
+from helper_functions.packed_binary import PackedBinary, popcount
 
-def coactivity(binsig: np.ndarray) -> np.ndarray:
+#Binary products are exact in float32 as long as counts stay below 2**24
+FLOAT32_EXACT_COUNT = 2**24
+#Size (in 64-bit words) of the temporary AND array of packed coactivity blocks
+PACKED_BLOCK_WORDS = 2**22
+
+def coactivity(binsig: np.ndarray, block_size: int = None) -> np.ndarray:
     """
-    Calculates coactivity of cells based on binarized cellular activity
+    Calculates coactivity of cells based on binarized cellular activity.
+    Counts of co-active frames of all cell pairs are calculated with one
+    binary matrix product (B.T @ B) and normalized by sqrt(nact1*nact2).
+    Cells without activity have zero coactivity with all other cells.
+    block_size: if provided, the matrix is calculated in blocks of block_size
+    cells (rows) to limit memory usage for very large numbers of cells
     """
+    if isinstance(binsig, PackedBinary):
+        return packed_coactivity(binsig, block_size)
+
     cell_num = len(binsig[0])
+    dtype = np.float32 if len(binsig) < FLOAT32_EXACT_COUNT else np.float64
+    active = np.asarray(binsig == 1, dtype=dtype)
+    nact_cells = np.sum(binsig, axis=0)
+
+    if block_size is None or block_size <= 0:
+        block_size = max(cell_num, 1)
+
+    ca_mat = np.zeros((cell_num, cell_num), float)
+    for start in range(0, cell_num, block_size):
+        stop = min(start+block_size, cell_num)
+        print_progress_bar(stop, cell_num, 'Calculating coactivity of cells')
+        nact = np.rint(active[:, start:stop].T @ active).astype(np.int64)
+        nact_pairs = np.outer(nact_cells[start:stop], nact_cells)
+        np.divide(nact, np.sqrt(nact_pairs), out=ca_mat[start:stop], where=nact_pairs > 0)
+    np.fill_diagonal(ca_mat, 1.0)
+    print('\n')
+    return ca_mat
+
+
+def packed_coactivity(binsig: PackedBinary, block_size: int = None) -> np.ndarray:
+    """
+    Calculates coactivity of cells directly from bit-packed binarized activity.
+    Co-active frames are counted as the popcount of ANDed 64-bit words.
+    """
+    cell_num = binsig.cells
+    words = binsig.cell_words()
+    nact_cells = binsig.active_counts()
+
+    if block_size is None or block_size <= 0:
+        block_size = max(1, PACKED_BLOCK_WORDS//max(1, cell_num*words.shape[1]))
 
-    ca_mat=np.zeros((cell_num,cell_num),float)
-    count = 0
-    total_steps = (cell_num*(cell_num-1)/2) -(cell_num-1)
-    for i in range(cell_num):
-        print_progress_bar(count+1, total_steps, 'Calculating coactivity of cells')
-        ca_mat[i,i] = 1.0
-        for ii in range(i):
-            nact1 = np.sum(binsig[:,i])
-            nact2 = np.sum(binsig[:,ii])
-            nact = len(binsig[np.where((binsig[:,ii]==1) & (binsig[:,i]==1))])
-            if (nact1>0 and nact2>0):
-                ca_mat[i][ii]=nact/np.sqrt(nact1*nact2)
-                ca_mat[ii][i]=ca_mat[i][ii]
-            count+=1
+    ca_mat = np.zeros((cell_num, cell_num), float)
+    for start in range(0, cell_num, block_size):
+        stop = min(start+block_size, cell_num)
+        print_progress_bar(stop, cell_num, 'Calculating coactivity of cells')
+        both_active = words[start:stop, None, :] & words[None, :, :]
+        nact = popcount(both_active).sum(axis=2, dtype=np.int64)
+        nact_pairs = np.outer(nact_cells[start:stop], nact_cells)
+        np.divide(nact, np.sqrt(nact_pairs), out=ca_mat[start:stop], where=nact_pairs > 0)
+    np.fill_diagonal(ca_mat, 1.0)
     print('\n')
     return ca_mat
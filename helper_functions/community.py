@@ -15,7 +15,6 @@ __MIN = 0.0000001
 
 import networkx as nx
 import sys
-import types
 import array
 
 
@@ -52,7 +51,7 @@ def partition_at_level(dendogram, level) :
     >>> G=nx.erdos_renyi_graph(100, 0.01)
     >>> dendo = generate_dendogram(G)
     >>> for level in range(len(dendo) - 1) :
-    >>>     print "partition at level", level, "is", partition_at_level(dendo, level)
+    >>>     print("partition at level", level, "is", partition_at_level(dendo, level))
     """
     partition = dendogram[0].copy()
     for index in range(1, level + 1) :
@@ -226,7 +225,7 @@ def generate_dendogram(graph, part_init = None) :
     >>> G=nx.erdos_renyi_graph(100, 0.01)
     >>> dendo = generate_dendogram(G)
     >>> for level in range(len(dendo) - 1) :
-    >>>     print "partition at level", level, "is", partition_at_level(dendo, level)
+    >>>     print("partition at level", level, "is", partition_at_level(dendo, level))
     """
     if type(graph) != nx.Graph :
         raise TypeError("Bad graph type, use only non directed graph")
@@ -321,7 +320,7 @@ def __renumber(dictionary) :
 def __load_binary(data) :
     """Load binary graph as used by the cpp implementation of this algorithm
     """
-    if type(data) == types.StringType :
+    if isinstance(data, str) :
         data = open(data, "rb")
         
     reader = array.array("I")
@@ -415,6 +414,8 @@ class Status :
         new_status.degrees = self.degrees.copy()
         new_status.gdegrees = self.gdegrees.copy()
         new_status.total_weight = self.total_weight
+        new_status.loops = self.loops.copy()
+        return new_status
 
     def init(self, graph, part = None) :
         """Initialize the status of a graph with every node in one community"""
@@ -439,11 +440,11 @@ class Status :
             for node in graph.nodes() :
                 com = part[node]
                 self.node2com[node] = com
-                deg = float(graph.degree(node, weigh = 'weight'))
+                deg = float(graph.degree(node, weight = 'weight'))
                 self.degrees[com] = self.degrees.get(com, 0) + deg
                 self.gdegrees[node] = deg
                 inc = 0.
-                for neighbor, datas in graph[node].iteritems() :
+                for neighbor, datas in graph[node].items() :
                     weight = datas.get("weight", 1)
                     if part[neighbor] == com :
                         if neighbor == node :
@@ -507,8 +508,8 @@ def __main() :
         filename = sys.argv[1]
         graphfile = __load_binary(filename)
         partition = best_partition(graphfile)
-        print(str(modularity(partition, graphfile)), file=filename)
-        for elem, part in partition.iteritems() :
+        print(str(modularity(partition, graphfile)))
+        for elem, part in partition.items() :
             print(str(elem) + " " + str(part))
     except (IndexError, IOError):
         print("Usage : ./community filename")
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import numpy as np
 
 import matplotlib.pyplot as plt
@@ -5,9 +7,28 @@ import matplotlib.pyplot as plt
 from scipy.signal import butter, sosfiltfilt
 from scipy.fftpack import rfft, irfft, fftfreq
 
+
+@lru_cache(maxsize=32)
+def butter_sos(order, cutoff, btype, fs):
+    """
+    Designs (and caches) the second-order sections of a Butterworth filter.
+    cutoff is a single frequency or a (low, high) tuple for band-pass filters.
+    """
+    nyq = 0.5*fs
+    if isinstance(cutoff, tuple):
+        normal_cutoff = [freq / nyq for freq in cutoff]
+    else:
+        normal_cutoff = cutoff / nyq
+    return butter(order, normal_cutoff, analog=False, btype=btype, output='sos')
+
+
 class Filter(object):
 
-    """docstring for Filter."""
+    """
+    Butterworth filter. The signal can be a single time series or a
+    (frames, cells) matrix, in which case all columns are filtered
+    at once along the time axis (axis 0).
+    """
 
     #def __init__(self, file, cell, fs=sampling):
     def __init__(self, signal, fs):
@@ -15,20 +36,22 @@ class Filter(object):
         #self.data = np.loadtxt(file).transpose()[cell]
         self.data = signal
 
+        self.fs = fs
+
         self.nyq = 0.5*fs
 
-        self.time = np.arange(0, (np.size(self.data-1))/fs, 1/fs)
 
+    @property
+    def time(self):
 
-    def bandpass(self, lowcut, highcut, order=5):
+        return np.arange(0, len(self.data)/self.fs, 1/self.fs)
 
-        low = lowcut / self.nyq
 
-        high = highcut / self.nyq
+    def bandpass(self, lowcut, highcut, order=5):
 
-        sos = butter(order, [low, high], analog=False, btype='band', output='sos')
+        sos = butter_sos(order, (lowcut, highcut), 'band', self.fs)
 
-        y = sosfiltfilt(sos, self.data)
+        y = sosfiltfilt(sos, self.data, axis=0)
 
         return y
 
@@ -36,11 +59,9 @@ class Filter(object):
 
     def lowpass(self, cutoff, order=5):
 
-        normal_cutoff = cutoff / self.nyq
+        sos = butter_sos(order, cutoff, 'low', self.fs)
 
-        sos = butter(order, normal_cutoff, btype='low', analog=False, output='sos')
-
-        y = sosfiltfilt(sos, self.data)
+        y = sosfiltfilt(sos, self.data, axis=0)
 
         return y
 
@@ -48,11 +69,9 @@ class Filter(object):
 
     def highpass(self, cutoff, order=1):
 
-        normal_cutoff = cutoff / self.nyq
-
-        sos = butter(order, normal_cutoff, btype='high', analog=False, output='sos')
+        sos = butter_sos(order, cutoff, 'high', self.fs)
 
-        y = sosfiltfilt(sos, self.data)
+        y = sosfiltfilt(sos, self.data, axis=0)
 
         return y
 
@@ -72,22 +91,27 @@ class Filter(object):
 
 
 class FFTFilter:
-    
+    """
+    FFT band-pass filter. The signal can be a single time series or a
+    (frames, cells) matrix, in which case all columns are transformed
+    at once along the time axis (axis 0).
+    """
+
     def __init__(self, signal, time):
         self.signal = signal
         self.time = time
         self.step = time[1] - time[0]
-    
+
     def find_fftfreq(self):
-        self.wt = fftfreq(self.signal.size, d = self.step)
-    
+        self.wt = fftfreq(self.signal.shape[0], d = self.step)
+
     def rfft(self):
-        self.f_signal = rfft(self.signal)
+        self.f_signal = rfft(self.signal, axis=0)
 
     def bandpass_filt(self, low, high):
+        #the frequency mask is computed once and applied to all columns
         self.cut_f_signal = self.f_signal.copy()
-        self.cut_f_signal[(self.wt<low)] = 0 
-        self.cut_f_signal[(self.wt>high)] = 0
-    
+        self.cut_f_signal[(self.wt<low)|(self.wt>high)] = 0
+
     def get_filtered_signal(self):
-        return irfft(self.cut_f_signal)
+        return irfft(self.cut_f_signal, axis=0)
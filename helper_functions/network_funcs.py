@@ -7,19 +7,43 @@ Network helper functions
 # pylint: disable=C0325
 # pylint: disable=C0200
 from typing import Tuple
-import random
 import numpy as np
 import networkx as nx
-from networkx.generators.random_graphs import fast_gnp_random_graph
-from helper_functions import community
+from scipy.sparse import csr_array, issparse, tril
+from scipy.sparse.csgraph import shortest_path, connected_components
+from helper_functions.louvain import louvain_communities
 
-def efficiency(G):
+#Number of source nodes of one block of shortest path searches (efficiency)
+EFFICIENCY_BLOCK_SOURCES = 256
+
+def graph_adjacency(G) -> csr_array:
+    """
+    Sparse (CSR) unweighted adjacency matrix of graph G with nodes 0..n-1
+    """
+    return nx.to_scipy_sparse_array(G, nodelist=range(len(G)), weight=None, format='csr')
+
+
+def adjacency_efficiency(adjacency: csr_array, block_size: int = EFFICIENCY_BLOCK_SOURCES):
+    """
+    Global efficiency from a sparse adjacency matrix: average inverse shortest path
+    length over all node pairs, disconnected pairs contribute 0.
+    Path lengths of block_size source nodes at a time are calculated with
+    breadth-first searches. Inverse lengths are summed sequentially in the same
+    (i<j) order as pairwise path searches.
+    """
     avg = 0.0
-    n = len(G)
-    for i in range(len(G)):
-        for j in range(i+1, len(G), 1):
-            if nx.has_path(G, i, j) == True:
-                avg += 1.0/nx.dijkstra_path_length(G, i, j)
+    n = adjacency.shape[0]
+    if n > 1:
+        for start in range(0, n, block_size):
+            sources = np.arange(start, min(start+block_size, n))
+            lengths = shortest_path(adjacency, directed=False, unweighted=True, indices=sources)
+            #lengths of pairs i<j in row-major order, unreachable pairs (inf) give 0
+            upper = lengths[np.triu(np.ones(lengths.shape, bool), k=start+1)]
+            inverse = np.zeros(len(upper)+1, float)
+            inverse[0] = avg
+            np.divide(1.0, upper, out=inverse[1:])
+            avg = np.cumsum(inverse)[-1]
+        avg = float(avg)
     if n > 0.0:
         avg = avg*2.0/(n*(n-1))
     else:
@@ -27,6 +51,13 @@ def efficiency(G):
     return avg
 
 
+def efficiency(G, block_size: int = EFFICIENCY_BLOCK_SOURCES):
+    """
+    Global efficiency of graph G (nodes 0..n-1), see adjacency_efficiency
+    """
+    return adjacency_efficiency(graph_adjacency(G), block_size)
+
+
 def avg_deg(G):
     avg = 0
     n = len(G)
@@ -44,96 +75,118 @@ def avg_cluss(G):
     return (avg/float(n))
 
 
-def max_struc(G):
+def adjacency_clustering(adjacency: csr_array) -> np.ndarray:
+    """
+    Clustering coefficients of all nodes from a sparse (0/1, no self loops) adjacency matrix.
+    Nodes with less than two neighbours have clustering 0 (as in nx.clustering).
+    """
+    degrees = np.asarray(adjacency.sum(axis=1)).ravel().astype(float)
+    #every triangle of node i is counted twice (j,k) and (k,j)
+    triangles = np.asarray((adjacency @ adjacency).multiply(adjacency).sum(axis=1)).ravel()
+    clustering = np.zeros(adjacency.shape[0], float)
+    closed = triangles > 0
+    clustering[closed] = triangles[closed]/(degrees[closed]*(degrees[closed]-1))
+    return clustering
+
+
+def adjacency_avg_clustering(adjacency: csr_array) -> float:
+    """
+    Average clustering coefficient from a sparse (0/1, no self loops) adjacency matrix
+    """
+    return float(np.sum(adjacency_clustering(adjacency))/float(adjacency.shape[0]))
+
+
+def max_struc(G, return_labels: bool = False):
+    """
+    Size of the largest connected component of graph G (nodes 0..n-1).
+    With return_labels also returns the connected component label of every node.
+    """
     n = len(G)
-    i = 0
-    j = 0
+    labels = np.zeros(n, int)
     S_max = 0
-    for i in range(n):
-        S = 0
-        for j in range(n):
-            if nx.has_path(G, i, j):
-                S += 1.0
-        if S_max < S:
-            S_max = S
+    if n > 0:
+        _, labels = connected_components(graph_adjacency(G), directed=False)
+        S_max = float(np.amax(np.bincount(labels)))
+    if return_labels:
+        return S_max, labels
     return S_max
 
 
-def commstructure(G):
-    skupnost = np.zeros(len(G), int)
+def commstructure(G, restarts: int = 1, seed: int = None, num_workers: int = 1):
+    """
+    Louvain community structure of graph G (nodes 0..n-1): the best of restarts runs
+    (see helper_functions.louvain). Returns the number of communities, modularity and
+    the community of every node (numbered from 1 in the order of the Louvain
+    communities, 0 for nodes without connections).
+    """
+    n = len(G)
     if G.number_of_edges() > 0:
-        partition = community.best_partition(G)
-        Q = community.modularity(partition, G)
+        partition, Q = louvain_communities(G, restarts, seed, num_workers)
+        partition = partition+1
     else:
-        partition = np.zeros([len(G)], float)
+        partition = np.zeros(n, int)
         Q = 0.0
-    cc_d = 1
-    for i in range(len(G)):
-        partition[i] = partition[i]+1
-    for i in range(len(G)):
-        if G.degree(i) < 1:
-            partition[i] = 0
-        skupnost[i] = partition[i]
-    a = sorted(skupnost)
-    test = 0
-    test_c = 0
-    vrednost = {}
-    for i in range(len(a)):
-        if int(a[i] > 0) and int(a[i]) != test:
-            test = int(a[i])
-            vrednost[test_c] = int(a[i])
-            test_c += 1
-    test_c += 1
-
-    for i in range(len(a)):
-        for j in range(len(vrednost)):
-            if vrednost[j] == skupnost[i]:
-                skupnost[i] = j+1
+    degrees = np.array([G.degree(i) for i in range(n)], int)
+    partition[degrees < 1] = 0
+    communities = np.unique(partition[partition > 0])
+    skupnost = np.zeros(n, int)
+    connected = partition > 0
+    skupnost[connected] = np.searchsorted(communities, partition[connected])+1
     maxmax = max(skupnost)
     return (maxmax, Q, skupnost)
 
 
-def fixed_kavg_conn_mat(R: np.ndarray, k_avg: float, step_th: float = 0.0001,
-                tries_th: int = 10000, tolerance: float = 0.20) -> Tuple[np.ndarray, float]:
+def fixed_kavg_conn_mat(R: np.ndarray, k_avg: float,
+                        tolerance: float = 0.20) -> Tuple[np.ndarray, float, float]:
     """
-    Calculates network with fixed average node degree
+    Calculates network with fixed average node degree.
+    Cells i and j are connected if conn_th < R[i,j] < 1.0. The threshold is selected
+    among the distinct values of R so that the average node degree is as close as
+    possible to k_avg. Returns connectivity matrix, threshold and achieved average degree.
     """
-    conn_mat = np.zeros((len(R), len(R)), int)
-    conn_th = np.average(R)
-
     for i in range(len(R)):
         R[i,i]=1.0
 
-    tries = 0
-    while tries < tries_th:
-        conn_mat[:,:] = 0
-        conn_mat[np.where((R > conn_th) & (R < 1.0))] = 1
-        avg = np.sum(conn_mat)/len(R)
-
-        if (avg < (1.0-tolerance)*k_avg):
-            conn_th = conn_th-step_th
-        elif (avg > (1.0+tolerance)*k_avg):
-            conn_th = conn_th+step_th
-        else:
-            return conn_mat, conn_th
+    #Number of connections (both directions) above every candidate threshold
+    values = np.sort(R[R < 1.0], axis=None)
+    thresholds = np.unique(values)
+    connections = len(values) - np.searchsorted(values, thresholds, side='right')
+    if len(values) > 0:
+        #a threshold just below the smallest value connects all pairs
+        thresholds = np.append(np.nextafter(thresholds[0], -np.inf), thresholds)
+        connections = np.append(len(values), connections)
+    else:
+        thresholds = np.array([np.average(R)])
+        connections = np.array([0])
 
-        tries += 1
+    degrees = connections/len(R)
+    best = np.argmin(np.abs(degrees - k_avg))
+    conn_th = float(thresholds[best])
+    achieved_k = float(degrees[best])
+    if not (1.0-tolerance)*k_avg <= achieved_k <= (1.0+tolerance)*k_avg:
+        raise BaseException(f"""Could not construct network with desired Kvg={k_avg}.
+                    Closest average degree is {achieved_k} at threshold {conn_th}.""")
 
-    raise BaseException(f"""Could not construct network with desired Kvg={k_avg}.
-                    Last threshold is {conn_th}.""")
+    conn_mat = np.zeros((len(R), len(R)), int)
+    conn_mat[np.where((R > conn_th) & (R < 1.0))] = 1
+    return conn_mat, conn_th, achieved_k
 
 
-def fixed_rth_conn_mat(R: np.ndarray, Rth: float) -> np.ndarray:
+def fixed_rth_conn_mat(R: np.ndarray, Rth: float, sparse: bool = False):
     """
-    Calculates fixed correlation threshold connectivity matrix
+    Calculates fixed correlation threshold connectivity matrix.
+    Cells i and j are connected if R[i,j] > Rth (i>j, lower triangle of R).
+    With sparse=True returns a symmetric scipy.sparse CSR matrix (uint8)
+    instead of a dense int matrix.
     """
+    rows, cols = np.nonzero(np.tril(R > Rth, k=-1))
+    if sparse:
+        edges = np.ones(2*len(rows), np.uint8)
+        return csr_array((edges, (np.concatenate((rows, cols)), np.concatenate((cols, rows)))),
+                         shape=R.shape)
     conn_mat = np.zeros(R.shape, int)
-    for i in range(len(R)):
-        for j in range(i):
-            if R[i,j]>Rth:
-                conn_mat[i,j] = 1
-                conn_mat[j,i] = 1
-
+    conn_mat[rows, cols] = 1
+    conn_mat[cols, rows] = 1
     return conn_mat
 
 def connection_lengths(G: nx.Graph, pos: np.ndarray) -> np.ndarray:
@@ -160,18 +213,12 @@ def get_graph_connections(graph: nx.Graph, undirected=True) -> list:
     return edges
 
 
-def small_world_coefficient(G: nx.Graph) -> float:
-    avg_k = avg_deg(G)
-
-    p=(len(G)*avg_k)/(len(G)*(len(G)-1))
-    random_G = fast_gnp_random_graph(len(G), p)
-
-    random_clust = avg_cluss(random_G)
-    graph_clust = avg_cluss(G)
-
-    graph_efficiency = efficiency(G)
-    random_efficiency = efficiency(random_G)
-    #print(graph_efficiency, random_efficiency)
+def small_world_ratio(graph_clust: float, graph_efficiency: float,
+                      random_clust: float, random_efficiency: float) -> float:
+    """
+    Small-world coefficient (C/C_random)/(L/L_random) with L = 1/efficiency
+    (L = 10 for zero efficiency, coefficient 0 for zero random clustering)
+    """
     try:
         graph_avg_length = 1.0/graph_efficiency
     except ZeroDivisionError:
@@ -188,32 +235,23 @@ def small_world_coefficient(G: nx.Graph) -> float:
     return SW
 
 
-def construct_graph_from_conn_mat(cmat: np.ndarray) -> nx.Graph:
+def construct_graph_from_conn_mat(cmat) -> nx.Graph:
     """
-    Creates a graph from a binarized connectivity matrix 
+    Creates a graph from a binarized connectivity matrix (dense or scipy.sparse).
+    Edges (i,j) with i>j are added in the row-major order of the lower triangle.
     """
-    cell_num = len(cmat)
+    cell_num = cmat.shape[0]
     G = nx.Graph()
-    for i in range(cell_num):
-        G.add_node(i)
-
-    for i in range(cell_num):
-        for j in range(i):
-            if i!=j and cmat[i,j]==1:
-                G.add_edge(i,j)
+    G.add_nodes_from(range(cell_num))
+
+    if issparse(cmat):
+        lower = tril(cmat, k=-1, format='csr')
+        lower.sort_indices()
+        rows, cols = lower.nonzero()
+        connected = lower.data[lower.data != 0] == 1
+        rows, cols = rows[connected], cols[connected]
+    else:
+        rows, cols = np.nonzero(np.tril(np.asarray(cmat) == 1, k=-1))
+    G.add_edges_from(zip(rows.tolist(), cols.tolist()))
 
     return G
-
-
-def calculate_hindex(G: nx.Graph, n: int) -> int:
-    """
-    Calculates the Hirsher-index of node n in graph G
-    """
-    sorted_neighbor_degrees = sorted((G.degree(v) for v in G.neighbors(n)), reverse=True)
-    h = 0
-    for i in range(1, len(sorted_neighbor_degrees)+1):
-        if sorted_neighbor_degrees[i-1] < i:
-            break
-        h = i
-
-    return h
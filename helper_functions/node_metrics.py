@@ -0,0 +1,159 @@
+"""
+Network parameters of all nodes (cells) calculated from the sparse adjacency matrix
+
+Degree, average neighbour degree, H-index and clustering are calculated with sparse
+matrix operations. Closeness and betweenness centrality are calculated with the
+Brandes algorithm, where breadth-first searches of a block of source nodes are done
+together (level by level) with sparse matrix products. Blocks of sources can be
+processed in a pool of worker processes. Values are the same as the ones of the
+corresponding networkx functions.
+"""
+from typing import Tuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.sparse import csr_array
+from helper_functions.parallel import column_shards
+from helper_functions.network_funcs import graph_adjacency, adjacency_clustering
+
+#Number of source nodes of one block of breadth-first searches
+PATH_BLOCK_SOURCES = 128
+NODE_METRICS_HEADER = 'k rel_k C Hindex CloseCent DegCent BetwCent AvgNNDeg Comm'
+NODE_METRICS_FORMAT = '%d %.3f %.3f %d %.3f %.3f %.3f %.3f %d'
+
+
+def neighbor_degree_metrics(adjacency: csr_array) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Degrees, average neighbour degrees and H-indices of all nodes
+    """
+    n = adjacency.shape[0]
+    rows, cols = adjacency.nonzero()
+    degrees = np.bincount(rows, minlength=n)
+    avg_nn_degrees = np.zeros(n, float)
+    connected = degrees > 0
+    neighbor_degree_sums = np.bincount(rows, degrees[cols], minlength=n)
+    avg_nn_degrees[connected] = neighbor_degree_sums[connected]/degrees[connected]
+
+    #H-index: number of the (descending) sorted neighbour degrees that are >= their rank
+    order = np.lexsort((-degrees[cols], rows))
+    rows, neighbor_degrees = rows[order], degrees[cols][order]
+    ranks = np.arange(len(rows)) - np.concatenate(([0], np.cumsum(degrees)))[rows] + 1
+    hindices = np.bincount(rows[neighbor_degrees >= ranks], minlength=n)
+    return degrees, avg_nn_degrees, hindices
+
+
+def path_metrics_block(adjacency: csr_array, sources: np.ndarray) -> Tuple[np.ndarray, np.ndarray,
+                                                                           np.ndarray]:
+    """
+    Breadth-first searches from a block of sources (level by level for all sources at once)
+    and Brandes dependency accumulation. Returns the number of reachable nodes and the sum
+    of shortest path lengths of every source and the (unscaled) betweenness of all nodes.
+    """
+    block = np.arange(len(sources))
+    sigma = np.zeros((len(sources), adjacency.shape[0]), float)
+    sigma[block, sources] = 1.0
+    depth = np.full(sigma.shape, -1, np.int64)
+    depth[block, sources] = 0
+    frontier = sigma.copy()
+    level = 0
+    while True:
+        #number of shortest paths to not yet visited nodes of the next level
+        reached = np.asarray(frontier @ adjacency)
+        new = (reached > 0) & (depth < 0)
+        if not new.any():
+            break
+        level += 1
+        depth[new] = level
+        frontier = np.where(new, reached, 0.0)
+        sigma += frontier
+
+    reachable = depth >= 0
+    counts = np.sum(reachable, axis=1)
+    path_sums = np.sum(np.where(reachable, depth, 0), axis=1)
+
+    delta = np.zeros(sigma.shape, float)
+    for current in range(level, 0, -1):
+        coefficients = np.zeros(sigma.shape, float)
+        np.divide(1.0 + delta, sigma, out=coefficients, where=depth == current)
+        delta += np.where(depth == current-1, sigma*np.asarray(coefficients @ adjacency), 0.0)
+    delta[block, sources] = 0.0
+    return counts, path_sums, np.sum(delta, axis=0)
+
+
+def path_metrics_sources(adjacency: csr_array, start: int, stop: int) -> tuple:
+    """
+    Path metrics (see path_metrics_block) of sources start:stop in blocks of PATH_BLOCK_SOURCES
+    """
+    counts, path_sums = [], []
+    betweenness = np.zeros(adjacency.shape[0], float)
+    for block_start in range(start, stop, PATH_BLOCK_SOURCES):
+        sources = np.arange(block_start, min(block_start+PATH_BLOCK_SOURCES, stop))
+        block_counts, block_sums, block_betweenness = path_metrics_block(adjacency, sources)
+        counts.append(block_counts)
+        path_sums.append(block_sums)
+        betweenness += block_betweenness
+    return start, np.concatenate(counts), np.concatenate(path_sums), betweenness
+
+
+def path_metrics(adjacency: csr_array, num_workers: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Closeness (nx.closeness_centrality) and betweenness (nx.betweenness_centrality)
+    centralities of all nodes. Sources are split into chunks processed in num_workers processes.
+    """
+    n = adjacency.shape[0]
+    counts = np.zeros(n, np.int64)
+    path_sums = np.zeros(n, np.int64)
+    betweenness = np.zeros(n, float)
+    shards = column_shards(n, max(1, num_workers))
+    if num_workers <= 1:
+        results = [path_metrics_sources(adjacency, start, stop) for start, stop in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(path_metrics_sources, adjacency, start, stop)
+                       for start, stop in shards]
+            results = [future.result() for future in futures]
+    for start, shard_counts, shard_sums, shard_betweenness in results:
+        counts[start:start+len(shard_counts)] = shard_counts
+        path_sums[start:start+len(shard_sums)] = shard_sums
+        betweenness += shard_betweenness
+
+    closeness = np.zeros(n, float)
+    if n > 1:
+        connected = path_sums > 0
+        reached = counts[connected] - 1.0
+        closeness[connected] = reached/path_sums[connected]*(reached/(n-1))
+    #normalization by the number of ordered (s, t) pairs (without endpoints)
+    if n - 1 >= 2:
+        betweenness *= 1/((n-1)*(n-2))
+    return closeness, betweenness
+
+
+def node_metrics(G, num_workers: int = 1) -> dict:
+    """
+    Network parameters of all nodes of graph G (nodes 0..n-1)
+    """
+    n = len(G)
+    adjacency = graph_adjacency(G)
+    degrees, avg_nn_degrees, hindices = neighbor_degree_metrics(adjacency)
+    closeness, betweenness = path_metrics(adjacency, num_workers)
+    degree_centrality = degrees*(1.0/(n-1.0)) if n > 1 else np.ones(n, float)
+    return {
+        'k': degrees,
+        'rel_k': degrees/n,
+        'C': adjacency_clustering(adjacency),
+        'Hindex': hindices,
+        'CloseCent': closeness,
+        'DegCent': degree_centrality,
+        'BetwCent': betweenness,
+        'AvgNNDeg': avg_nn_degrees
+    }
+
+
+def save_node_metrics(path: str, metrics: dict, communities: np.ndarray):
+    """
+    Saves network parameters of all nodes (and their communities) in one write
+    """
+    columns = [metrics[name] for name in NODE_METRICS_HEADER.split()[:-1]] + [communities]
+    lines = [NODE_METRICS_HEADER] + [NODE_METRICS_FORMAT % values
+                                     for values in zip(*(column.tolist() for column in columns))]
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines) + '\n')
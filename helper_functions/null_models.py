@@ -0,0 +1,94 @@
+"""
+Null-model (random graph) ensembles for the small-world coefficient
+
+The network is compared with null_models random graphs with the same number of
+nodes and edges (G(n, m) graphs). Clustering and efficiency of the random graphs
+are calculated from sparse adjacency matrices, optionally in a pool of worker
+processes. Every random graph has its own seed derived from one (optional) seed,
+so results do not depend on the number of worker processes.
+"""
+from typing import Tuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import stats
+from scipy.sparse import csr_array
+from helper_functions.parallel import column_shards
+from helper_functions.network_funcs import (adjacency_efficiency, adjacency_avg_clustering,
+                                            small_world_ratio)
+
+#Confidence level of the reported small-world coefficient interval
+CONFIDENCE_LEVEL = 0.95
+
+
+def pair_nodes(pairs: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts indices of node pairs (i<j, row-major order of the upper triangle)
+    to node indices i and j
+    """
+    pairs = np.asarray(pairs, np.int64)
+    i = (n - 2 - np.floor(np.sqrt(-8*pairs + 4*n*(n-1) - 7)/2.0 - 0.5)).astype(np.int64)
+    #corrects rounding of the square root
+    row_start = i*n - i*(i+1)//2
+    i[row_start > pairs] -= 1
+    row_start = i*n - i*(i+1)//2
+    next_start = row_start + n - i - 1
+    i[next_start <= pairs] += 1
+    row_start = i*n - i*(i+1)//2
+    j = pairs - row_start + i + 1
+    return i, j
+
+
+def random_adjacency(n: int, m: int, rng: np.random.Generator) -> csr_array:
+    """
+    Adjacency matrix of a G(n, m) random graph (m distinct node pairs chosen uniformly)
+    """
+    pairs = rng.choice(n*(n-1)//2, size=m, replace=False)
+    i, j = pair_nodes(pairs, n)
+    edges = np.ones(2*m, np.int64)
+    return csr_array((edges, (np.concatenate((i, j)), np.concatenate((j, i)))), shape=(n, n))
+
+
+def null_model_metrics(n: int, m: int, seeds: list) -> np.ndarray:
+    """
+    Average clustering and efficiency (columns) of random graphs with the given seeds (rows)
+    """
+    metrics = np.zeros((len(seeds), 2), float)
+    for k, seed in enumerate(seeds):
+        adjacency = random_adjacency(n, m, np.random.default_rng(seed))
+        metrics[k] = adjacency_avg_clustering(adjacency), adjacency_efficiency(adjacency)
+    return metrics
+
+
+def small_world_ensemble(G, graph_clust: float, graph_efficiency: float, null_models: int,
+                         seed: int = None, num_workers: int = 1) -> Tuple[float, float, float]:
+    """
+    Small-world coefficient of graph G against null_models random graphs with the
+    same number of nodes and edges. graph_clust and graph_efficiency are the average
+    clustering and efficiency of G. Returns mean and confidence interval
+    (CONFIDENCE_LEVEL, nan for a single null model) of the coefficients.
+    """
+    if null_models < 1:
+        # pylint: disable-next=W0719
+        raise BaseException('Please select at least one null model (SMALL_WORLD_NULL_MODELS).')
+    n = len(G)
+    m = G.number_of_edges()
+    seeds = np.random.SeedSequence(seed).spawn(null_models)
+    shards = column_shards(null_models, max(1, num_workers), shards_per_worker=1)
+
+    if num_workers <= 1:
+        metrics = np.concatenate([null_model_metrics(n, m, seeds[start:stop])
+                                  for start, stop in shards])
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(null_model_metrics, n, m, seeds[start:stop])
+                       for start, stop in shards]
+            metrics = np.concatenate([future.result() for future in futures])
+
+    coefficients = np.array([small_world_ratio(graph_clust, graph_efficiency,
+                                               float(random_clust), float(random_efficiency))
+                             for random_clust, random_efficiency in metrics])
+    mean = float(np.mean(coefficients))
+    if null_models < 2:
+        return mean, np.nan, np.nan
+    half_width = stats.sem(coefficients)*stats.t.ppf((1.0+CONFIDENCE_LEVEL)/2.0, null_models-1)
+    return mean, float(mean-half_width), float(mean+half_width)
@@ -0,0 +1,125 @@
+"""
+Bit-packed container for binarized time series
+"""
+# pylint: disable=C0103
+import numpy as np
+
+#Number of set bits of every possible byte (used when np.bitwise_count is not available)
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], np.uint8)
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """
+    Counts set bits of every element of an unsigned integer array
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    byte_counts = _BYTE_POPCOUNT[values.view(np.uint8)]
+    return byte_counts.reshape(values.shape+(values.itemsize,)).sum(axis=-1)
+
+
+class PackedBinary:
+    """
+    Binarized time series (frames, cells) packed to single bits along time.
+    Uses 1/64 of the memory of an int (int64) matrix. Supports len(), .shape,
+    and [rows, cols] indexing (rows and cols are indexed independently
+    and only the selected bits are unpacked). The full int matrix is only
+    created when it is explicitly requested (unpack() or np.asarray)
+    """
+
+    def __init__(self, packed: np.ndarray, frames: int):
+        self.packed = packed
+        self.frames = int(frames)
+
+    @classmethod
+    def from_array(cls, binsig: np.ndarray) -> 'PackedBinary':
+        """
+        Packs a binarized (0/1) time series matrix of shape (frames, cells)
+        """
+        binsig = np.asarray(binsig)
+        return cls(np.packbits(binsig == 1, axis=0), len(binsig))
+
+    @property
+    def cells(self) -> int:
+        """
+        Number of cells (columns)
+        """
+        return self.packed.shape[1]
+
+    @property
+    def shape(self) -> tuple:
+        """
+        Shape of the unpacked matrix
+        """
+        return (self.frames, self.cells)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the packed bits
+        """
+        return self.packed.nbytes
+
+    def __len__(self) -> int:
+        return self.frames
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        rows, cols = key
+        frame_idx = np.arange(self.frames)[rows]
+        cell_idx = np.arange(self.cells)[cols]
+        flat_frames = np.atleast_1d(frame_idx)
+        flat_cells = np.atleast_1d(cell_idx)
+        #rows and columns are selected together (only the selected cells are read)
+        byte_rows = self.packed[np.ix_(flat_frames >> 3, flat_cells)]
+        shift = (7 - (flat_frames & 7)).astype(np.uint8)
+        values = (byte_rows >> shift[:, None]) & 1
+        return values.astype(int).reshape(np.shape(frame_idx)+np.shape(cell_idx))
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.unpack()
+        return values if dtype is None else values.astype(dtype)
+
+    def unpack(self) -> np.ndarray:
+        """
+        Returns the full binarized time series as an int matrix
+        """
+        return np.unpackbits(self.packed, axis=0, count=self.frames).astype(int)
+
+    def select_cells(self, cells) -> 'PackedBinary':
+        """
+        Returns a new container with the selected cells (columns) only
+        """
+        return PackedBinary(self.packed[:, cells], self.frames)
+
+    def active_counts(self) -> np.ndarray:
+        """
+        Number of active frames of every cell
+        """
+        return popcount(self.packed).sum(axis=0, dtype=np.int64)
+
+    def active_frames(self) -> np.ndarray:
+        """
+        Indices of frames with at least one active cell
+        """
+        any_active = np.bitwise_or.reduce(self.packed, axis=1)
+        return np.flatnonzero(np.unpackbits(any_active, count=self.frames))
+
+    def cell_words(self) -> np.ndarray:
+        """
+        Bits of every cell as a contiguous row of 64-bit words (cells, words)
+        """
+        padding = (-len(self.packed)) % 8
+        cell_bytes = np.zeros((self.cells, len(self.packed)+padding), np.uint8)
+        cell_bytes[:, :len(self.packed)] = self.packed.T
+        return cell_bytes.view(np.uint64)
+
+
+def as_packed(binsig) -> PackedBinary:
+    """
+    Returns binsig as PackedBinary (packs it if necessary)
+    """
+    if isinstance(binsig, PackedBinary):
+        return binsig
+    return PackedBinary.from_array(binsig)
@@ -0,0 +1,78 @@
+"""
+Helper functions for running independent per-cell computations
+in a pool of worker processes
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from helper_functions.utility_functions import print_progress_bar
+
+#Data matrix shared with the current worker process
+_WORKER_DATA = {}
+
+
+def _attach_shared_data(name: str, shape: tuple, dtype: str):
+    """
+    Worker initializer. Attaches the shared data matrix without copying it.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    _WORKER_DATA['shm'] = shm
+    _WORKER_DATA['data'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _run_shard(func, start: int, stop: int, args: tuple) -> tuple:
+    """
+    Runs func on columns start:stop of the shared data matrix
+    """
+    return start, stop, func(_WORKER_DATA['data'], start, stop, *args)
+
+
+def column_shards(cell_num: int, num_workers: int, shards_per_worker: int = 4) -> list:
+    """
+    Splits cell indices into contiguous (start, stop) shards
+    """
+    shard_num = max(1, min(cell_num, num_workers*shards_per_worker))
+    bounds = np.linspace(0, cell_num, shard_num+1).astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def map_cell_shards(func, data: np.ndarray, num_workers: int = 1, args: tuple = (),
+                    prefix: str = '', dtype=float) -> np.ndarray:
+    """
+    Applies func to shards of cells (columns) of data and assembles the results
+    in the original column order.
+    func(data, start, stop, *args) must return an array of shape (frames, stop-start)
+    and must be a module level function (so it can be sent to worker processes).
+    With num_workers > 1 the data matrix is placed in shared memory once and
+    all worker processes read it from there.
+    """
+    cell_num = len(data[0])
+    result = np.zeros((len(data), cell_num), dtype)
+    shards = column_shards(cell_num, max(1, num_workers))
+    done = 0
+
+    if num_workers <= 1:
+        for start, stop in shards:
+            result[:,start:stop] = func(data, start, stop, *args)
+            done += stop-start
+            print_progress_bar(done, cell_num, prefix)
+        return result
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+    try:
+        shared_data = np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)
+        shared_data[:] = data
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_attach_shared_data,
+                                 initargs=(shm.name, data.shape, data.dtype.str)) as executor:
+            futures = [executor.submit(_run_shard, func, start, stop, args)
+                       for start, stop in shards]
+            for future in as_completed(futures):
+                start, stop, shard_result = future.result()
+                result[:,start:stop] = shard_result
+                done += stop-start
+                print_progress_bar(done, cell_num, prefix)
+        del shared_data
+    finally:
+        shm.close()
+        shm.unlink()
+    return result
@@ -0,0 +1,170 @@
+"""
+Vectorized kernel of the slope (amplitude increase and slope) binarization method.
+Gives the same binarized signal as methods.bin_traces_old.signal_binarization
+"""
+# pylint: disable=C0103
+# pylint: disable=R0914
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def amplitude_std(data: np.ndarray) -> np.ndarray:
+    """
+    Calculates the STD (varsig) of all (mean-centered) time series
+    without the first and last 5% of the time series
+    """
+    cut_out = int(round(0.05*len(data)))
+    return np.array([np.std(data[cut_out:-cut_out, i]) for i in range(len(data[0]))])
+
+
+def oscillation_onsets(data: np.ndarray, PB: int, act_slope: float,
+                       amp_faktor: float) -> tuple:
+    """
+    Finds oscillation onsets of all cells.
+    data: mean-centered (frames, cells) time series matrix
+    PB: expected oscillation duration (in samples)
+
+    returns: list of onset arrays (one per cell) and the amplitude STD (varsig) of cells
+    """
+    ts_length, cell_num = data.shape
+    # (cells, frames) layout so that every cell is a contiguous row
+    series = np.ascontiguousarray(data.T)
+    varsig = amplitude_std(data)
+
+    offset = int(PB/3.0)
+    frames = np.arange(ts_length-PB-2)
+    slope_ts = ((series[:, frames+offset-1]+series[:, frames+offset] +
+                 series[:, frames+offset+1])/3.0)-series[:, frames]
+    varderser2 = np.array([np.std(slope_ts[i]) for i in range(cell_num)])
+
+    onset_frames = np.arange(int(5*PB), ts_length-PB-2)
+    if len(onset_frames) == 0:
+        return [np.zeros(0, int) for _ in range(cell_num)], varsig
+
+    # averaged 5-point slope at every frame needed by the onset search
+    slope_frames = np.arange(onset_frames[0], onset_frames[-1]+5)
+    slope_5 = ((series[:, slope_frames-2]+series[:, slope_frames-1]+series[:, slope_frames] +
+                series[:, slope_frames+1]+series[:, slope_frames+2])/5.0)-series[:, slope_frames]
+    ims = np.argmax(sliding_window_view(slope_5, 5, axis=1), axis=2)
+
+    ok0 = slope_ts[:, onset_frames] > (act_slope*varderser2)[:, None]
+
+    # number of points above the amplitude threshold in the next PB points
+    above = np.zeros((cell_num, ts_length+1), int)
+    np.cumsum(series > (amp_faktor*varsig)[:, None], axis=1, out=above[:, 1:])
+    ok1 = above[:, onset_frames+PB] - above[:, onset_frames]
+    candidates = ok0 & (ok1 > 2)
+
+    distance_window = int(1.25*PB)
+    onsets = []
+    for rep in range(cell_num):
+        cell_candidates = np.flatnonzero(candidates[rep])
+        frames_rep = onset_frames[cell_candidates]
+        tact = []
+        pos = 0
+        while pos < len(cell_candidates):
+            i = frames_rep[pos]
+            if tact and distance_window > 0 and i < tact[-1]+PB and \
+                    i+distance_window-1 > tact[-1]-PB:
+                # all candidates before tact[-1]+PB are too close to the previous onset
+                pos = np.searchsorted(frames_rep, tact[-1]+PB)
+                continue
+            tact.append(i+int(PB/10.0)+ims[rep, cell_candidates[pos]])
+            pos += 1
+        onsets.append(np.array(tact, int))
+
+    return onsets, varsig
+
+
+def _first_extremum(series: np.ndarray, cells: np.ndarray, start: np.ndarray,
+                    width: int, limit: int, find_max: bool) -> tuple:
+    """
+    Searches series[cell, start+1:start+width] (up to limit) for the first
+    maximum (minimum) of every (cell, start) pair. The search starts from
+    -10000 (10000) and the start frame is returned if no point exceeds it.
+    """
+    init_value = -10000.0 if find_max else 10000.0
+    values = np.full(len(start), init_value)
+    frames = np.array(start, int)
+    if width <= 1 or len(start) == 0:
+        return values, frames
+    window = start[:, None] + np.arange(1, width)
+    valid = window < limit
+    window_values = series[cells[:, None], np.where(valid, window, 0)]
+    if find_max:
+        window_values = np.where(valid, window_values, -np.inf)
+        arg = np.argmax(window_values, axis=1)
+    else:
+        window_values = np.where(valid, window_values, np.inf)
+        arg = np.argmin(window_values, axis=1)
+    extremum = window_values[np.arange(len(start)), arg]
+    update = extremum > init_value if find_max else extremum < init_value
+    values[update] = extremum[update]
+    frames[update] = window[update, arg[update]]
+    return values, frames
+
+
+def slope_binarization(data: np.ndarray, PB: int, act_slope: float,
+                       amp_faktor: float) -> tuple:
+    """
+    Binarizes all time series at once based on the amplitude increase
+    and slope of oscillations.
+    data: mean-centered (frames, cells) time series matrix
+
+    returns: binarized signal (frames, cells) and the amplitude STD (varsig) of cells
+    """
+    ts_length, cell_num = data.shape
+    series = np.ascontiguousarray(data.T)
+    onsets, varsig = oscillation_onsets(data, PB, act_slope, amp_faktor)
+
+    nnact = np.array([len(tact) for tact in onsets], int)
+    cells = np.repeat(np.arange(cell_num), nnact)
+    tact = np.concatenate(onsets) if cell_num > 0 else np.zeros(0, int)
+
+    # oscillation maximum, following minimum and the end of the oscillation
+    # (first point under half amplitude between the maximum and minimum)
+    limit = ts_length-2*PB
+    maxser, tmax = _first_extremum(series, cells, tact, int(1.5*PB), limit, True)
+    minser, tmin = _first_extremum(series, cells, tmax, int(2*PB), limit, False)
+
+    tfin = np.array(tmax)
+    if len(tmax) > 0 and int(2*PB) > 1:
+        window = tmax[:, None] + np.arange(1, int(2*PB))
+        valid = window < tmin[:, None]
+        below = valid & (series[cells[:, None], np.where(valid, window, 0)] <
+                         (0.5*maxser+0.5*minser)[:, None])
+        found = np.any(below, axis=1)
+        tfin[found] = window[found, np.argmax(below[found], axis=1)]
+
+    # Each oscillation is ON from its onset to its end. The oscillation
+    # index advances one frame after the previous minimum was passed, so the
+    # ON interval of oscillation k can not start before that frame.
+    first = np.concatenate(([0], np.cumsum(nnact)[:-1])) if cell_num > 0 else nnact
+    order_in_cell = np.arange(len(tact)) - np.repeat(first, nnact)
+    advance = np.full(len(tact), ts_length)
+    for rep in range(cell_num):
+        if nnact[rep] > 1:
+            k = np.arange(nnact[rep]-1)
+            cell_tmin = tmin[first[rep]:first[rep]+nnact[rep]-1]
+            advance[first[rep]:first[rep]+nnact[rep]-1] = k + \
+                np.maximum.accumulate(cell_tmin+1-k)
+    previous_advance = np.where(order_in_cell > 0, np.roll(advance, 1)+1, 0)
+
+    starts = np.maximum(tact, previous_advance)
+    stops = np.minimum(np.minimum(tfin, advance), ts_length-PB-3)
+    on = starts <= stops
+    binsig_switch = np.zeros((cell_num, ts_length+1), np.int8)
+    np.add.at(binsig_switch, (cells[on], starts[on]), 1)
+    np.add.at(binsig_switch, (cells[on], stops[on]+1), -1)
+    binsig = np.array(np.cumsum(binsig_switch[:, :ts_length], axis=1, dtype=np.int8).T > 0, int)
+
+    return binsig, varsig
+
+
+def binarize_cells(data: np.ndarray, start: int, stop: int, PB: int, act_slope: float,
+                   amp_faktor: float) -> np.ndarray:
+    """
+    Binarizes time series (columns) start:stop of the mean-centered data
+    """
+    binsig, _ = slope_binarization(data[:, start:stop], PB, act_slope, amp_faktor)
+    return binsig
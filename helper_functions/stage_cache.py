@@ -0,0 +1,234 @@
+"""
+Cache of analysis step (stage) results.
+
+A stage result is stored under a hash of the stage input arrays and of the
+configuration fields the stage reads. Files the stage writes in the experiment
+folders (preprocessing/{EXPERIMENT_NAME} and results/{EXPERIMENT_NAME}) are stored
+with the result. If the same stage is run again with the same inputs and
+configurations, the stored result is loaded and its files are restored instead of
+recomputed.
+Cache size on disk is limited by STAGE_CACHE_MAX_MB (least recently used
+results are removed first). STAGE_CACHE_MAX_MB = 0 disables the cache.
+"""
+import os
+import json
+import shutil
+import hashlib
+from functools import wraps
+import numpy as np
+from helper_functions.packed_binary import PackedBinary
+from helper_functions.artifact_store import save_artifact, load_artifact
+
+STAGE_CACHE_FOLDER = '.stage_cache'
+#Increase when stage outputs change so old results are not reused
+STAGE_CACHE_VERSION = 3
+#Configuration fields used by all steps (output folders, plotted intervals, exports)
+COMMON_CONFIG_KEYS = ['EXPERIMENT_NAME', 'SAMPLING', 'INTERVAL_START_TIME_SECONDS',
+                      'INTERVAL_END_TIME_SECONDS', 'EXPORT_TEXT_FILES', 'CELL_FIGURES',
+                      'CELLS_PER_PAGE']
+#Size of the blocks of rows of input arrays added to the hash
+HASH_BLOCK_BYTES = 2**24
+
+
+def hash_array(hasher, data):
+    """
+    Adds shape, type and content of data to hasher
+    """
+    if isinstance(data, PackedBinary):
+        hasher.update(f'packed{data.shape}'.encode())
+        data = data.packed
+    data = np.atleast_1d(data)
+    hasher.update(f'{data.shape}{data.dtype.str}'.encode())
+    #rows are added in blocks, so non-contiguous (e.g. memory-mapped column) views
+    #are never copied as a whole
+    row_bytes = max(1, data[:1].nbytes)
+    step = max(1, HASH_BLOCK_BYTES//row_bytes)
+    for start in range(0, len(data), step):
+        hasher.update(np.ascontiguousarray(data[start:start+step]).data)
+
+
+def stage_key(stage: str, config_data: dict, config_keys: list, inputs: list) -> str:
+    """
+    Calculates the cache key of a stage from its input arrays and
+    the configuration fields (COMMON_CONFIG_KEYS + config_keys) it reads
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    used_configs = {key: config_data[key] for key in COMMON_CONFIG_KEYS + config_keys}
+    hasher.update(json.dumps([STAGE_CACHE_VERSION, stage, used_configs],
+                             sort_keys=True).encode())
+    for data in inputs:
+        hash_array(hasher, data)
+    return f'{stage}_{hasher.hexdigest()}'
+
+
+def experiment_folders(config_data: dict) -> list:
+    """
+    Folders with files written by stages
+    """
+    return [os.path.join('preprocessing', config_data['EXPERIMENT_NAME']),
+            os.path.join('results', config_data['EXPERIMENT_NAME'])]
+
+
+def snapshot_files(folders: list) -> dict:
+    """
+    Modification time, size and inode of all files in folders (and their subfolders)
+    """
+    files = {}
+    for folder in folders:
+        for path, _, names in os.walk(folder):
+            for name in names:
+                file_path = os.path.join(path, name)
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                files[file_path] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    return files
+
+
+def written_files(before: dict, after: dict, roots: list) -> dict:
+    """
+    Files written by a stage (new or changed files) and folders owned by the stage
+    (folders below the experiment folders (roots) in which all files were written by the stage)
+    """
+    written = sorted(path for path, stat in after.items() if before.get(path) != stat)
+    written_set = set(written)
+    folders = {}
+    for path in after:
+        folder = os.path.dirname(path)
+        folders[folder] = folders.get(folder, True) and path in written_set
+    owned = sorted(folder for folder, all_written in folders.items()
+                   if all_written and folder not in roots)
+    return {'written': written, 'owned': owned}
+
+
+def restore_files(folder: str):
+    """
+    Restores files stored with a stage result. Other files in folders owned by the
+    stage (e.g. figures of a different CELL_FIGURES mode) are removed.
+    """
+    with open(os.path.join(folder, 'files.json'), encoding='utf-8') as file:
+        files = json.load(file)
+    written = set(files['written'])
+    for owned in files['owned']:
+        if not os.path.isdir(owned):
+            continue
+        for entry in os.scandir(owned):
+            if entry.is_file() and entry.path not in written:
+                os.remove(entry.path)
+    for path in files['written']:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(os.path.join(folder, 'files', path), path)
+
+
+def load_stage(key: str, outputs: list) -> dict:
+    """
+    Loads stored stage outputs. Returns None if the result is not stored
+    """
+    folder = os.path.join(STAGE_CACHE_FOLDER, key)
+    if not os.path.exists(os.path.join(folder, 'complete')):
+        return None
+    results = {}
+    try:
+        for name in outputs:
+            results[name], _ = load_artifact(os.path.join(folder, name))
+        restore_files(folder)
+        #marks the result as recently used
+        os.utime(folder)
+    except FileNotFoundError:
+        #removed by another process (e.g. batch worker) sharing the cache
+        return None
+    return results
+
+
+def store_stage(key: str, results: dict, files: dict, max_megabytes: float):
+    """
+    Stores stage outputs and written files and removes least recently used results
+    if the cache is larger than max_megabytes
+    """
+    folder = os.path.join(STAGE_CACHE_FOLDER, key)
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder, exist_ok=True)
+    for name, data in results.items():
+        if data is not None:
+            save_artifact({'EXPORT_TEXT_FILES': False}, os.path.join(folder, name), data, '')
+    for path in files['written']:
+        os.makedirs(os.path.join(folder, 'files', os.path.dirname(path)), exist_ok=True)
+        shutil.copyfile(path, os.path.join(folder, 'files', path))
+    with open(os.path.join(folder, 'files.json'), 'w', encoding='utf-8') as file:
+        json.dump(files, file)
+    #results without the marker file are incomplete and never loaded
+    with open(os.path.join(folder, 'complete'), 'w', encoding='utf-8'):
+        pass
+    evict_stages(max_megabytes*1024**2)
+
+
+def folder_size(folder: str) -> int:
+    """
+    Size of all files in folder and its subfolders (in bytes)
+    """
+    return sum(size for _, size, _ in snapshot_files([folder]).values())
+
+
+def evict_stages(max_bytes: float):
+    """
+    Removes least recently used stage results until the cache is smaller than max_bytes.
+    Results removed meanwhile by other processes sharing the cache are skipped.
+    """
+    modification_times = {}
+    for entry in os.scandir(STAGE_CACHE_FOLDER):
+        try:
+            if entry.is_dir():
+                modification_times[entry.path] = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue
+    entries = sorted(modification_times, key=modification_times.get)
+    sizes = {entry: folder_size(entry) for entry in entries}
+    total_size = sum(sizes.values())
+    for entry in entries:
+        if total_size <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total_size -= sizes[entry]
+
+
+def cached_stage(inputs: list, outputs: list, config_keys: list):
+    """
+    Decorator for Islet steps. Skips the step if a result for the same
+    inputs (Islet attribute names) and configuration fields is stored,
+    and sets the stored outputs (Islet attribute names) and restores the files
+    written by the step instead.
+    Steps are run as usual if any input is missing.
+    """
+    def decorate(func):
+        @wraps(func)
+        def applicator(self, *args, **kwargs):
+            max_megabytes = self.configs['STAGE_CACHE_MAX_MB']
+            input_data = [getattr(self, name) for name in inputs]
+            if max_megabytes <= 0 or any(data is None for data in input_data):
+                return func(self, *args, **kwargs)
+
+            key = stage_key(func.__name__, self.configs, config_keys, input_data)
+            results = load_stage(key, outputs)
+            if results is not None:
+                for name, data in results.items():
+                    setattr(self, name, data)
+                # pylint: disable-next=C0301
+                print(f'Step {func.__name__.upper()} skipped. Configurations and data did not change (result loaded from {STAGE_CACHE_FOLDER}).')
+                return None
+
+            previous_results = [getattr(self, name) for name in outputs]
+            folders = experiment_folders(self.configs)
+            previous_files = snapshot_files(folders)
+            value = func(self, *args, **kwargs)
+            results = {name: getattr(self, name) for name in outputs}
+            files = written_files(previous_files, snapshot_files(folders), folders)
+            #a step that did not set new outputs or write files (e.g. invalid method) is not stored
+            new_results = (any(data is not previous for data, previous
+                               in zip(results.values(), previous_results))
+                           or (not outputs and files['written']))
+            if new_results and all(data is not None for data in results.values()):
+                store_stage(key, results, files, max_megabytes)
+            return value
+        return applicator
+    return decorate
@@ -4,9 +4,10 @@ Utility function for the scripts
 # pylint: disable=R0913
 import os
 import json
-import numpy as np
-from copy import deepcopy
 import traceback
+from copy import deepcopy
+from functools import wraps
+from helper_functions.artifact_store import load_artifact
 
 SAMPLE_CONFIG_DATA = {
     "EXPERIMENT_NAME": "2023_01_03_GLC9_MS_SER1",
@@ -23,8 +24,13 @@ SAMPLE_CONFIG_DATA = {
     "HIGH_FREQUENCY_CUTOFF": 1.1,
     "SMOOTHING_POINTS": 4,
     "SMOOTHING_REPEATS": 2,
+    "NUM_WORKERS": 1,
+    "EXPORT_TEXT_FILES": True,
+    "STAGE_CACHE_MAX_MB": 2048,
+    "CELL_FIGURES": "single",
+    "CELLS_PER_PAGE": 12,
     "BINARIZATION": {
-        "USE": "SLOPE_METHOD",
+        "USE": "SLOPE_METHOD_VECTORIZED",
         "SLOPE_METHOD": {
             "OSCILLATION_DURATION": 10,
             "ACTIVATION_SLOPE": 1.0,
@@ -42,15 +48,47 @@ SAMPLE_CONFIG_DATA = {
     "NETWORK_METHOD": "fixed_kavg",
     "CONNECTIVITY_LEVEL": 8.0,
     "FIXED_KAVG_TOLERANCE": 0.1,
+    "SMALL_WORLD_NULL_MODELS": 20,
+    "RANDOM_SEED": None,
+    "LOUVAIN_RESTARTS": 1,
     "WAVES": {
         "TIME_TH_SECONDS": 0.5,
         "DISTANCE_TH": 30,
-        "REL_SIZE_THRESHOLD": 0.45
+        "REL_SIZE_THRESHOLD": 0.45,
+        "STREAMING": False
     }
 }
 # pylint: disable-next=C0103
 
 
+#Configuration fields added in later versions. Configurations files without
+#them are completed with their default values (from SAMPLE_CONFIG_DATA)
+ADDED_CONFIG_FIELDS = [
+    ('NUM_WORKERS',), ('EXPORT_TEXT_FILES',), ('STAGE_CACHE_MAX_MB',), ('CELL_FIGURES',),
+    ('CELLS_PER_PAGE',), ('SMALL_WORLD_NULL_MODELS',), ('RANDOM_SEED',), ('LOUVAIN_RESTARTS',),
+    ('WAVES', 'STREAMING')
+]
+
+
+def complete_config_data(config_data: dict) -> list:
+    """
+    Adds missing fields of ADDED_CONFIG_FIELDS (with default values) to config_data.
+    Values of all provided fields are kept. Returns names of added fields.
+    """
+    added_fields = []
+    for field in ADDED_CONFIG_FIELDS:
+        provided, sample = config_data, SAMPLE_CONFIG_DATA
+        for key in field[:-1]:
+            provided, sample = provided.get(key), sample[key]
+            if not isinstance(provided, dict):
+                break
+        else:
+            if field[-1] not in provided:
+                provided[field[-1]] = deepcopy(sample[field[-1]])
+                added_fields.append('.'.join(field))
+    return added_fields
+
+
 def validate_config_data(config_data: dict) -> bool:
     """
     Checks if provided configuration data has all necessary fields
@@ -127,20 +165,15 @@ def load_existing_data(config_data: dict):
                  'final_first_responder_times']
     loaded_data = []
     for data_name in data_list:
-        data = None
         path = ''
-        try:
-            if data_name.startswith('final'):
-                path = 'results/'
-            # pylint: disable-next=C0301
-            data = np.loadtxt(
-                f'preprocessing/{config_data["EXPERIMENT_NAME"]}/{path}{data_name}.txt')
-            loaded_data.append(
-                f'preprocessing/{config_data["EXPERIMENT_NAME"]}/{path}{data_name}.txt - LOADED'
-            )
-        except FileNotFoundError:
-            pass
-        data_collection[data_name] = deepcopy(data)
+        if data_name.startswith('final'):
+            path = 'results/'
+        # binary (.npy/.npz) artifacts are memory-mapped, text files are a fallback
+        data, file_name = load_artifact(
+            f'preprocessing/{config_data["EXPERIMENT_NAME"]}/{path}{data_name}')
+        if file_name is not None:
+            loaded_data.append(f'{file_name} - LOADED')
+        data_collection[data_name] = data
 
     return data_collection, loaded_data
 
@@ -170,16 +203,52 @@ def print_progress_bar(iteration: int, total: int, prefix: str = '', suffix: str
         print('\n')
 
 
+#Interactive (True) or batch mode (False). In batch mode nothing is asked from the user
+#and errors are raised to the caller
+RUN_MODE = {'interactive': True}
+
+
+def set_interactive(interactive: bool):
+    """
+    Sets interactive (run.py) or batch (batch_run.py) mode
+    """
+    RUN_MODE['interactive'] = interactive
+
+
+def is_interactive() -> bool:
+    """
+    Returns True in interactive mode
+    """
+    return RUN_MODE['interactive']
+
+
+def step_error(message: str):
+    """
+    Reports a missing prerequisite or an invalid method of a step.
+    Prints the message in interactive mode and raises it in batch mode
+    (so the step is marked as failed).
+    """
+    if is_interactive():
+        print(message)
+        return
+    # pylint: disable-next=W0719
+    raise BaseException(' '.join(message.split()))
+
+
 ##try-except "watcher" function
 def catch_error():
     """
     Catches all expected and unexpected errors in the app.
+    In batch mode errors are raised to the caller.
     """
     def decorate(func):
+        @wraps(func)
         def applicator(*args, **kwargs):
             try:
                 return func(*args, **kwargs)
             except Exception as err:
+                if not is_interactive():
+                    raise
                 print(f"Unexpected error encountered in step {func.__name__.upper()}")
                 print(f"ERROR MESSAGE: {err}")
                 print("""If you wish you can report the issue on:
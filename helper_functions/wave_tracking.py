@@ -0,0 +1,289 @@
+"""
+Tracking of activity waves (events) through binarized time series
+
+Cells closer than DISTANCE_TH are neighbours. Neighbour pairs are found once with
+a k-d tree. Active frames are processed in order and active cells are labeled
+with event numbers using the labels of the previous frame and of their active
+neighbours (in the same order of cells and neighbour pairs as in the original
+per-frame implementation, so labels are identical). Activity of every cell in
+the time window of the last FRAME_TH frames is kept as rolling counts.
+Frames can also be added in chunks (streaming). Completed events are then reported
+as soon as they end and only the state of the last frames is kept.
+"""
+from collections import deque
+import numpy as np
+from scipy.spatial import cKDTree
+from helper_functions.utility_functions import print_progress_bar
+
+
+def neighbour_lists(pos: np.ndarray, distance_th: float) -> list:
+    """
+    Ascending indices of neighbours (0 < distance < distance_th) of every cell
+    """
+    cell_num = len(pos)
+    #k-d tree distances are only used for candidate pairs (with a small margin),
+    #pairs are selected with the same euclidean distance as scipy.spatial.distance.cdist
+    pairs = cKDTree(pos).query_pairs(distance_th*(1.0+1e-9)+1e-12, output_type='ndarray')
+    distances = np.sqrt(np.sum((pos[pairs[:, 0]] - pos[pairs[:, 1]])**2, axis=1))
+    pairs = pairs[(distances < distance_th) & (distances != 0)]
+    sources = np.concatenate((pairs[:, 0], pairs[:, 1]))
+    targets = np.concatenate((pairs[:, 1], pairs[:, 0]))
+    order = np.lexsort((targets, sources))
+    sources, targets = sources[order], targets[order]
+    bounds = np.searchsorted(sources, np.arange(cell_num+1))
+    return [targets[bounds[i]:bounds[i+1]].tolist() for i in range(cell_num)]
+
+
+class RollingActivity:
+    """
+    Number of active frames of every cell in the window
+    binarized_time_series[frame-frame_th:frame+1] (with python slice semantics)
+    for increasing active frames. frame_num is the number of frames of the
+    recording (None for a recording of unknown length, longer than frame_th frames).
+    """
+    def __init__(self, cell_num: int, frame_th: int, frame_num: int = None):
+        self.counts = np.zeros(cell_num, int)
+        self.frame_th = frame_th
+        self.frame_num = frame_num
+        self.window = deque()
+        self.empty = True
+
+    def add_frame(self, frame: int, active_cells: np.ndarray):
+        """
+        Moves the window to end with frame (active_cells are active cells of frame)
+        """
+        self.window.append((frame, active_cells))
+        self.counts[active_cells] += 1
+        if self.frame_num is None:
+            start = frame-self.frame_th if frame >= self.frame_th else frame+1
+        else:
+            start, _, _ = slice(frame-self.frame_th, frame+1).indices(self.frame_num)
+        #for frame < frame_th the (negative) slice start usually gives an empty window
+        self.empty = start > frame
+        if self.empty:
+            return
+        while self.window[0][0] < start:
+            _, old_cells = self.window.popleft()
+            self.counts[old_cells] -= 1
+
+    def count(self, cell: int) -> int:
+        """
+        Number of active frames of cell in the current window
+        """
+        return 0 if self.empty else self.counts[cell]
+
+
+class WaveTracker:
+    """
+    Labels active cells of frames added in increasing order with event numbers
+    (1, 2, ... in the order of events, as renumbered event numbers of the whole recording).
+    Only the labels of the previous active frame, activity of the last frame_th frames
+    and open events are kept. Labels are only passed on from the previous frame, so an
+    event is completed in the first frame in which none of the active cells has its label.
+    frame_num (if known) is the number of frames of the recording (see RollingActivity).
+    """
+    def __init__(self, neighbours: list, frame_th: int, frame_num: int = None):
+        self.neighbour_sets = [set(cells) for cells in neighbours]
+        self.frame_th = frame_th
+        self.activity = RollingActivity(len(neighbours), frame_th, frame_num)
+        self.active_frame_num = 0
+        self.next_frame = 0
+        self.previous_frame, self.previous_labels = None, {}
+        self.max_label = 0
+        self.event_num = 0
+        #open events: label -> [event number, start frame, end frame, {cell: first active frame}]
+        self.open_events = {}
+
+    def frame_labels(self, frame: int, active_cells: np.ndarray) -> dict:
+        """
+        Labels (not yet renumbered event numbers) of active cells of an active frame
+        """
+        frame_th = self.frame_th
+        neighbour_sets = self.neighbour_sets
+        i = self.active_frame_num
+        self.activity.add_frame(frame, active_cells)
+        active_cells = active_cells.tolist()
+        active_set = set(active_cells)
+        k = self.max_label + 1
+        #labels of active cells (all labels of active cells are > 0)
+        if i == 0:
+            labels = {cell: k+j for j, cell in enumerate(active_cells)}
+            for cell_i in active_cells:
+                for cell_j in neighbour_sets[cell_i].intersection(active_set):
+                    labels[cell_i] = min(labels[cell_i], labels[cell_j])
+                    labels[cell_j] = labels[cell_i]
+        else:
+            previous = self.previous_labels if self.previous_frame == frame-1 else {}
+            labels = {cell: previous.get(cell, k+i) for cell in active_cells}
+            for cell_i in active_cells:
+                previous_i = previous.get(cell_i, 0)
+                for cell_j in neighbour_sets[cell_i].intersection(active_set):
+                    previous_j = previous.get(cell_j, 0)
+                    if(previous_i != 0 and self.activity.count(cell_i) <= frame_th
+                       and previous_j == 0):
+                        labels[cell_j] = labels[cell_i]
+                    elif(previous_i == 0 and previous_j != 0
+                         and self.activity.count(cell_j) <= frame_th):
+                        labels[cell_i] = labels[cell_j]
+                    elif previous_i == 0 and previous_j == 0:
+                        labels[cell_i] = min(labels[cell_i], labels[cell_j])
+                        labels[cell_j] = labels[cell_i]
+
+        self.active_frame_num += 1
+        self.max_label = max(self.max_label, max(labels.values()))
+        self.previous_frame, self.previous_labels = frame, labels
+        return labels
+
+    def add_frame(self, frame: int, active_cells: np.ndarray) -> tuple:
+        """
+        Adds a frame (active_cells are its active cells, frames must increase).
+        Returns event numbers of active cells and events completed before this frame.
+        """
+        self.next_frame = frame + 1
+        if len(active_cells) == 0:
+            return [], self.close_events(set())
+        labels = self.frame_labels(frame, active_cells)
+        frame_events = set(labels.values())
+        completed = self.close_events(frame_events)
+        #new labels are larger than all previous labels
+        for label in sorted(frame_events.difference(self.open_events)):
+            self.event_num += 1
+            self.open_events[label] = [self.event_num, frame, frame, {}]
+        event_numbers = []
+        for cell, label in labels.items():
+            event = self.open_events[label]
+            event[2] = frame
+            event[3].setdefault(cell, frame)
+            event_numbers.append(event[0])
+        return event_numbers, completed
+
+    def add_chunk(self, chunk: np.ndarray) -> tuple:
+        """
+        Adds consecutive frames (rows of chunk) following the last added frame.
+        Returns event numbers (array of the chunk shape) and events completed in the chunk.
+        """
+        chunk = np.asarray(chunk)
+        event_numbers = np.zeros(chunk.shape, int)
+        completed = []
+        for row in range(len(chunk)):
+            active_cells = np.flatnonzero(chunk[row])
+            event_numbers[row, active_cells], closed = self.add_frame(self.next_frame, active_cells)
+            completed.extend(closed)
+        return event_numbers, completed
+
+    def close_events(self, frame_events: set) -> list:
+        """
+        Completes open events that are not in frame_events.
+        Completed events are (event number, start frame, end frame, {cell: first active frame}).
+        """
+        completed = [label for label in self.open_events if label not in frame_events]
+        return sorted(tuple(self.open_events.pop(label)) for label in completed)
+
+    def finish(self) -> list:
+        """
+        Completes all open events (end of the recording)
+        """
+        return self.close_events(set())
+
+
+def track_waves(binarized_time_series, neighbours: list, frame_th: int,
+                act_sig: np.ndarray) -> np.ndarray:
+    """
+    Labels active cells of all active frames with event numbers (1, 2, ...).
+    binarized_time_series is a PackedBinary, act_sig a zero matrix of the same shape.
+    """
+    frame_num, _ = binarized_time_series.shape
+    active_frames = binarized_time_series.active_frames()
+    tracker = WaveTracker(neighbours, frame_th, frame_num)
+    for i, frame in enumerate(active_frames.tolist()):
+        print_progress_bar(i+1, len(active_frames), f'Analyzing frame {frame}')
+        active_cells = np.flatnonzero(binarized_time_series[frame, :])
+        act_sig[frame, active_cells], _ = tracker.add_frame(frame, active_cells)
+    return act_sig
+
+
+def frame_chunks(binarized_time_series, chunk_frames: int):
+    """
+    Consecutive chunks of (at most chunk_frames) frames of a binarized time series.
+    Only the frames of a chunk are unpacked (PackedBinary) or read from disk (memory-mapped data).
+    """
+    for start in range(0, len(binarized_time_series), chunk_frames):
+        yield binarized_time_series[start:start+chunk_frames, :]
+
+
+def first_activations(act_sig: np.ndarray, event_numbers: np.ndarray, start_frames: np.ndarray,
+                      end_frames: np.ndarray) -> tuple:
+    """
+    First active frame of every cell in every event of event_numbers (in the time span
+    start_frames..end_frames of the event). Returns frames, cells and events.
+    """
+    cell_num = act_sig.shape[1]
+    frames, cells = np.nonzero(act_sig)
+    labels = act_sig[frames, cells]
+    event_rows = np.full(int(max(np.amax(act_sig, initial=0), np.amax(event_numbers, initial=0)))+1, -1)
+    event_rows[event_numbers] = np.arange(len(event_numbers))
+    rows = event_rows[labels]
+    in_event = rows >= 0
+    in_event[in_event] = ((frames[in_event] >= start_frames[rows[in_event]])
+                          & (frames[in_event] <= end_frames[rows[in_event]]))
+    frames, cells, labels = frames[in_event], cells[in_event], labels[in_event]
+    keys = labels.astype(np.int64)*cell_num + cells
+    _, first = np.unique(keys, return_index=True)
+    return frames[first], cells[first], labels[first]
+
+
+def event_table(act_sig: np.ndarray) -> tuple:
+    """
+    Event numbers (ascending) with start frames, end frames and numbers of
+    participating cells of all events, computed in one pass over act_sig
+    """
+    cell_num = act_sig.shape[1]
+    frames, cells = np.nonzero(act_sig)
+    events, inverse = np.unique(act_sig[frames, cells], return_inverse=True)
+    if len(events) == 0:
+        empty = np.zeros(0, int)
+        return events, empty, empty, empty
+    #entries grouped by event (frames stay ascending within groups)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(inverse))[:-1]))
+    start_frames = np.minimum.reduceat(frames[order], bounds)
+    end_frames = np.maximum.reduceat(frames[order], bounds)
+    event_cells = np.unique(inverse.astype(np.int64)*cell_num + cells)
+    cell_counts = np.bincount(event_cells // cell_num, minlength=len(events))
+    return events, start_frames, end_frames, cell_counts
+
+
+def group_min_ranks(groups: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Ranks of values within their groups (as scipy.stats.rankdata(..., 'min') of every group)
+    """
+    ranks = np.zeros(len(values), float)
+    if len(values) == 0:
+        return ranks
+    order = np.lexsort((values, groups))
+    sorted_groups, sorted_values = groups[order], values[order]
+    index = np.arange(len(values))
+    new_group = np.concatenate(([True], sorted_groups[1:] != sorted_groups[:-1]))
+    new_value = new_group | np.concatenate(([True], sorted_values[1:] != sorted_values[:-1]))
+    group_start = np.maximum.accumulate(np.where(new_group, index, 0))
+    first_equal = np.maximum.accumulate(np.where(new_value, index, 0))
+    ranks[order] = first_equal - group_start + 1
+    return ranks
+
+
+def group_percentiles(groups: np.ndarray, values: np.ndarray, percentile: float) -> tuple:
+    """
+    Groups (ascending) and percentiles of values of every group
+    (linear interpolation, with the same arithmetic as np.percentile)
+    """
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    unique_groups, starts, counts = np.unique(groups[order], return_index=True, return_counts=True)
+    virtual = (counts - 1) * np.true_divide(percentile, 100)
+    previous = np.floor(virtual).astype(int)
+    following = np.minimum(previous + 1, counts - 1)
+    gamma = virtual - previous
+    below, above = sorted_values[starts + previous], sorted_values[starts + following]
+    difference = above - below
+    percentiles = np.where(gamma >= 0.5, above - difference*(1 - gamma), below + difference*gamma)
+    return unique_groups, percentiles
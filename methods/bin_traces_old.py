@@ -12,6 +12,12 @@ import numpy as np
 import matplotlib.pyplot as plt
 from helper_functions.ploting_funcs import binarized_plot
 from helper_functions.utility_functions import print_progress_bar
+from helper_functions.slope_binarization import binarize_cells, amplitude_std
+from helper_functions.parallel import map_cell_shards
+from helper_functions.artifact_store import save_artifact
+from helper_functions.cell_figures import render_cell_figures
+from methods.binarization import binarized_traces_layout
+from helper_functions.packed_binary import as_packed
 
 
 def signal_binarization(CONFIG_DATA: dict, data: np.ndarray, pos: np.ndarray) -> np.ndarray:
@@ -20,19 +26,15 @@ def signal_binarization(CONFIG_DATA: dict, data: np.ndarray, pos: np.ndarray) ->
     on amplitude increase and slope of oscillations
     """
     EXPERIMENT_NAME = CONFIG_DATA['EXPERIMENT_NAME']
-    sampling = CONFIG_DATA['SAMPLING']
     PB = int(CONFIG_DATA['BINARIZATION']['SLOPE_METHOD']['OSCILLATION_DURATION'])
     act_slope = CONFIG_DATA['BINARIZATION']['SLOPE_METHOD']['ACTIVATION_SLOPE']
     amp_faktor = CONFIG_DATA['BINARIZATION']['SLOPE_METHOD']['AMPLITUDE_FACTOR']
-    start_time_seconds = CONFIG_DATA['INTERVAL_START_TIME_SECONDS']
-    end_time_seconds = CONFIG_DATA['INTERVAL_END_TIME_SECONDS']
 
     if not os.path.exists(f'preprocessing/{EXPERIMENT_NAME}/binarized_traces'):
         os.makedirs(f'preprocessing/{EXPERIMENT_NAME}/binarized_traces')
 
     ts_length, cell_num = data.shape
 
-    time = [i/sampling for i in range(ts_length)]
     #data = data-np.mean(data)
     for i in range(cell_num):
         data[:,i] = data[:,i] - np.mean(data[:,i])
@@ -146,32 +148,65 @@ def signal_binarization(CONFIG_DATA: dict, data: np.ndarray, pos: np.ndarray) ->
             if ( (i>tact[rep][ii]) and (ii==(len(tact[rep]))) ):
                 nobin=1
 
+    plot_binarized_traces(CONFIG_DATA, data, binsig, varsig, pos)
+    return binsig
+
+
+def fast_signal_binarization(CONFIG_DATA: dict, data: np.ndarray, pos: np.ndarray) -> np.ndarray:
+    """
+    Performs time series binarization based
+    on amplitude increase and slope of oscillations.
+    Uses the vectorized kernel for all cells at once and gives
+    the same result as signal_binarization
+    """
+    EXPERIMENT_NAME = CONFIG_DATA['EXPERIMENT_NAME']
+    PB = int(CONFIG_DATA['BINARIZATION']['SLOPE_METHOD']['OSCILLATION_DURATION'])
+    act_slope = CONFIG_DATA['BINARIZATION']['SLOPE_METHOD']['ACTIVATION_SLOPE']
+    amp_faktor = CONFIG_DATA['BINARIZATION']['SLOPE_METHOD']['AMPLITUDE_FACTOR']
+    NUM_WORKERS = CONFIG_DATA['NUM_WORKERS']
+
+    if not os.path.exists(f'preprocessing/{EXPERIMENT_NAME}/binarized_traces'):
+        os.makedirs(f'preprocessing/{EXPERIMENT_NAME}/binarized_traces')
+
+    cell_num = len(data[0])
+    for i in range(cell_num):
+        data[:,i] = data[:,i] - np.mean(data[:,i])
+
+    binsig = map_cell_shards(binarize_cells, data, NUM_WORKERS,
+                             args=(PB, act_slope, amp_faktor),
+                             prefix='Calculating oscillation parameters ', dtype=int)
+    varsig = amplitude_std(data)
+
+    plot_binarized_traces(CONFIG_DATA, data, binsig, varsig, pos)
+    return binsig
+
+
+def plot_binarized_traces(CONFIG_DATA: dict, data: np.ndarray, binsig: np.ndarray,
+                          varsig: np.ndarray, pos: np.ndarray):
+    """
+    Normalizes the (mean-centered) time series and plots/saves the binarized traces
+    """
+    EXPERIMENT_NAME = CONFIG_DATA['EXPERIMENT_NAME']
+    sampling = CONFIG_DATA['SAMPLING']
+    amp_faktor = CONFIG_DATA['BINARIZATION']['SLOPE_METHOD']['AMPLITUDE_FACTOR']
+    start_time_seconds = CONFIG_DATA['INTERVAL_START_TIME_SECONDS']
+    end_time_seconds = CONFIG_DATA['INTERVAL_END_TIME_SECONDS']
+
+    ts_length, cell_num = data.shape
+    time = [i/sampling for i in range(ts_length)]
+
     for rep in range(cell_num):
         data[:, rep] = (data[:, rep]-min(data[:, rep])) / \
             (max(data[:, rep])-min(data[:, rep]))
 
-    for i in range(cell_num):
-        print_progress_bar(i+1, cell_num, f'Ploting binarized time series {i} ')
-        fig, (ax1, ax2) = plt.subplots(2, 1)
-        ax1.set_title(f'Cell {i}')
-        ax1.plot(time, data[:, i], c='dimgray', linewidth=0.5)
-        ax1.plot(time, binsig[:, i], c='red', linewidth=0.2)
-        ax1.set_ylabel('Signal (a.u.)')
-
-        ax2.plot(time, data[:, i], c='dimgray', linewidth=0.5)
-        ax2.plot(time, binsig[:, i], c='red', linewidth=0.2)
-        ax2.axhline(amp_faktor*varsig[i]+np.mean(data[:,i]), c='blue', linewidth=0.2)
-        ax2.set_xlabel('time (s)')
-        ax2.set_ylabel('Binarized signal')
-        ax2.set_xlim(start_time_seconds, end_time_seconds)
-
-        plt.subplots_adjust(hspace=0.15)
-        fig.savefig(f'preprocessing/{EXPERIMENT_NAME}/binarized_traces/binarized_traces_{i}.png',
-                    dpi=200, bbox_inches='tight', pad_inches=0.01)
-        plt.close(fig)
-
-    np.savetxt(f'preprocessing/{EXPERIMENT_NAME}/binarized_traces.txt', binsig, fmt='%d')
+    save_artifact(CONFIG_DATA, f'preprocessing/{EXPERIMENT_NAME}/binarized_traces',
+                  as_packed(binsig), fmt='%d')
+
+    threshold = np.array([amp_faktor*varsig[i]+np.mean(data[:,i]) for i in range(cell_num)])
+    layout = binarized_traces_layout(EXPERIMENT_NAME, (start_time_seconds, end_time_seconds),
+                                     threshold=True)
+    render_cell_figures(CONFIG_DATA, layout, time, {'signal': data, 'binarized': binsig},
+                        {'threshold': threshold}, prefix='Plotting binarized time series')
     fig = binarized_plot(time, binsig, pos)
     fig.savefig(f'preprocessing/{EXPERIMENT_NAME}/raster_plot.png', dpi=200, bbox_inches='tight')
     plt.close(fig)
-    return binsig
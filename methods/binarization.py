@@ -8,7 +8,10 @@ import os
 import numpy as np
 import matplotlib.pyplot as plt
 from helper_functions.ploting_funcs import binarized_plot
-from helper_functions.utility_functions import print_progress_bar
+from helper_functions.parallel import map_cell_shards
+from helper_functions.artifact_store import save_artifact
+from helper_functions.cell_figures import render_cell_figures
+from helper_functions.packed_binary import as_packed
 from scipy.signal import find_peaks, peak_widths
 
 def binarize_data(CONFIG_DATA: dict, data: np.ndarray, pos: np.ndarray) -> np.ndarray:
@@ -24,6 +27,7 @@ def binarize_data(CONFIG_DATA: dict, data: np.ndarray, pos: np.ndarray) -> np.nd
     INTERVAL_END_TIME_SECONDS = CONFIG_DATA['INTERVAL_END_TIME_SECONDS']
     SAMPLING = CONFIG_DATA['SAMPLING']
     EXPERIMENT_NAME = CONFIG_DATA['EXPERIMENT_NAME']
+    NUM_WORKERS = CONFIG_DATA['NUM_WORKERS']
     ############################################
     ###### Settings#################
     # For signal visualization
@@ -46,65 +50,89 @@ def binarize_data(CONFIG_DATA: dict, data: np.ndarray, pos: np.ndarray) -> np.nd
     # Calculates and sets necessary data
     number_of_cells = len(data[0])
     time = [i/SAMPLING for i in range(len(data))]
-    bin_signal = np.zeros((len(data), number_of_cells), int)
 
     if not os.path.exists(f'preprocessing/{EXPERIMENT_NAME}/binarized_traces'):
         os.makedirs(f'preprocessing/{EXPERIMENT_NAME}/binarized_traces')
 
-    for i in range(number_of_cells):
-        print_progress_bar(i+1, number_of_cells, f'Binarizing time series {i} ')
-        # peaks: indexes of detected peaks
-        peaks, _ = find_peaks(data[:, i],
-                                    height=amp_fact*np.average(data[:, i]),
-                                    distance=distance,
-                                    width=width,
-                                    prominence=prominence)
-
-        _, _, left_ips, right_ips = peak_widths(data[:, i],
-                                                                peaks,
-                                                                rel_height=rel_height)
-
-        bin_signal[peaks, i] = 1
-        for index, left_points, right_points in zip(peaks, left_ips, right_ips):
-            left_width = index - (index - int(round(left_points)))
-            right_width = index + (int(round(right_points)) - index)
-            max_amp = np.amax(data[index-left_width:index+right_width+1, i])
-            min_amp = np.amin(data[index-left_width:index+right_width+1, i])
-            threshold_amp = min_amp + (max_amp - min_amp)/2.0
-
-            # Binarizes points left and right from the detected peak
-            # if amplitude >= threshold_amp
-            for j in range(1, max(left_width, right_width), 1):
-                if index-j >= 0:
-                    if data[index-j, i] >= threshold_amp:
-                        if data[index-j+1, i] > threshold_amp:
-                            bin_signal[index-j, i] = 1
-                if index+j < len(data)-1:
-                    if data[index+j, i] >= threshold_amp:
-                        if data[index+j-1, i] > threshold_amp:
-                            bin_signal[index+j, i] = 1
-
-        fig, (ax1, ax2) = plt.subplots(2, 1)
-        ax1.set_title(f'Cell {i}')
-        ax1.plot(time, data[:, i], c='dimgray', linewidth=0.5)
-        ax1.plot(time, bin_signal[:, i], c='red', linewidth=0.2)
-        ax1.set_ylabel('Signal (a.u.)')
-
-        ax2.plot(time, data[:, i], c='dimgray', linewidth=0.5)
-        ax2.plot(time, bin_signal[:, i], c='red', linewidth=0.2)
-        ax2.set_xlabel('time (s)')
-        ax2.set_ylabel('Binarized signal')
-        ax2.set_xlim(start_time_seconds, end_time_seconds)
-
-        plt.subplots_adjust(hspace=0.15)
-        fig.savefig(f'preprocessing/{EXPERIMENT_NAME}/binarized_traces/binarized_traces_{i}.png',
-                    dpi=200, bbox_inches='tight', pad_inches=0.01)
-        plt.close(fig)
-
-    np.savetxt(f'preprocessing/{EXPERIMENT_NAME}/binarized_traces.txt', bin_signal, fmt='%d')
+    bin_signal = map_cell_shards(binarize_cells, data, NUM_WORKERS,
+                                 args=(amp_fact, distance, width, prominence, rel_height),
+                                 prefix='Binarizing time series ', dtype=int)
+
+    save_artifact(CONFIG_DATA, f'preprocessing/{EXPERIMENT_NAME}/binarized_traces',
+                  as_packed(bin_signal), fmt='%d')
+
+    layout = binarized_traces_layout(EXPERIMENT_NAME, (start_time_seconds, end_time_seconds))
+    render_cell_figures(CONFIG_DATA, layout, time, {'signal': data, 'binarized': bin_signal},
+                        prefix='Plotting binarized time series')
 
     fig = binarized_plot(time, bin_signal, pos)
     fig.savefig(f'preprocessing/{EXPERIMENT_NAME}/raster_plot.png', dpi=200, bbox_inches='tight')
     plt.close(fig)
 
     return bin_signal
+
+
+def binarized_traces_layout(EXPERIMENT_NAME: str, interval: tuple, threshold: bool = False) -> dict:
+    """
+    Layout of the per-cell binarized trace figures
+    (with the amplitude threshold line for the slope method)
+    """
+    lines = [('signal', 'dimgray', 0.5), ('binarized', 'red', 0.2)]
+    return {
+        'name': 'binarized_traces_threshold' if threshold else 'binarized_traces',
+        'folder': f'preprocessing/{EXPERIMENT_NAME}/binarized_traces',
+        'file': 'binarized_traces_{cell}.png',
+        'panels': [
+            {'title': 'Cell {cell}', 'ylabel': 'Signal (a.u.)', 'xlim': None, 'lines': lines},
+            {'ylabel': 'Binarized signal', 'xlabel': 'time (s)', 'xlim': interval, 'lines': lines,
+             'hline': ('threshold', 'blue', 0.2) if threshold else None}
+        ],
+        'hspace': 0.15,
+        'savefig': {'dpi': 200, 'bbox_inches': 'tight', 'pad_inches': 0.01}
+    }
+
+
+def binarize_cell(series: np.ndarray, amp_fact: float, distance: int, width: int,
+                  prominence: float, rel_height: float) -> np.ndarray:
+    """
+    Binarizes a single time series with the peak prominence method
+    """
+    bin_series = np.zeros(len(series), int)
+    # peaks: indexes of detected peaks
+    peaks, _ = find_peaks(series,
+                          height=amp_fact*np.average(series),
+                          distance=distance,
+                          width=width,
+                          prominence=prominence)
+
+    _, _, left_ips, right_ips = peak_widths(series,
+                                            peaks,
+                                            rel_height=rel_height)
+
+    bin_series[peaks] = 1
+    for index, left_points, right_points in zip(peaks, left_ips, right_ips):
+        left_width = index - (index - int(round(left_points)))
+        right_width = index + (int(round(right_points)) - index)
+        max_amp = np.amax(series[index-left_width:index+right_width+1])
+        min_amp = np.amin(series[index-left_width:index+right_width+1])
+        threshold_amp = min_amp + (max_amp - min_amp)/2.0
+
+        # Binarizes points left and right from the detected peak
+        # if amplitude >= threshold_amp
+        for j in range(1, max(left_width, right_width), 1):
+            if index-j >= 0:
+                if series[index-j] >= threshold_amp:
+                    if series[index-j+1] > threshold_amp:
+                        bin_series[index-j] = 1
+            if index+j < len(series)-1:
+                if series[index+j] >= threshold_amp:
+                    if series[index+j-1] > threshold_amp:
+                        bin_series[index+j] = 1
+    return bin_series
+
+
+def binarize_cells(data: np.ndarray, start: int, stop: int, *params) -> np.ndarray:
+    """
+    Binarizes time series (columns) start:stop with the peak prominence method
+    """
+    return np.column_stack([binarize_cell(data[:, i], *params) for i in range(start, stop)])
@@ -11,10 +11,13 @@ Analysis of all cellular parameters
 import os
 import numpy as np
 import matplotlib.pyplot as plt
-from helper_functions.cell_parameters import find_clusters
+from helper_functions.cell_parameters import activity_parameters
 from methods import plot_configurations
 from methods.plot_configurations import PANEL_HEIGHT, MEDIAN_PROPS, BOX_PROPS
 
+#Number of cells unpacked (if bit-packed) and analyzed together
+CELL_BLOCK_SIZE = 256
+
 def cell_activity_data(CONFIG_DATA: dict, binarized_time_series: np.array):
     """
     Performs cell activity parameter analysis
@@ -32,46 +35,15 @@ def cell_activity_data(CONFIG_DATA: dict, binarized_time_series: np.array):
     interval_start_time_frames = int(INTERVAL_START_TIME_SECONDS*sampling)
     interval_end_time_frames = int(INTERVAL_END_TIME_SECONDS*sampling)
 
-    binarized_time_series = binarized_time_series[interval_start_time_frames:interval_end_time_frames,:]
-
-    cell_num = len(binarized_time_series[0])
-    time_series_length = len(binarized_time_series)
-
-    cell_data = {
-        'relative_active_times': [],
-        'oscillation_frequencies': [],
-        'avg_oscillation_durations': [],
-        'interoscillation_int_var': []
-    }
-
-    for i in range(cell_num):
-        cell_data['relative_active_times'].append(
-            np.sum(binarized_time_series[:, i])/time_series_length)
-
-        activity_clusters = find_clusters(binarized_time_series[:, i])
-        frequency = np.nan
-        osc_dur = np.nan
-        if len(activity_clusters[1])>0:
-            frequency = len(activity_clusters[0]) / \
-                (INTERVAL_END_TIME_SECONDS-INTERVAL_START_TIME_SECONDS)
-            osc_dur = np.average(activity_clusters[1])/sampling
-
-        cell_data['oscillation_frequencies'].append(frequency)
-        cell_data['avg_oscillation_durations'].append(osc_dur)
-
-        inactivity_clusters = find_clusters(
-            binarized_time_series[:, i], trigger_val=0)
-
-        avg_inactivity_duration = np.nan
-        inactivity_duration_std = np.nan
-        if len(inactivity_clusters[1] > 2):
-            inactivity_duration_std = np.std(inactivity_clusters[1])/sampling
-            avg_inactivity_duration = np.average(inactivity_clusters[1])/sampling
+    # cells are unpacked (if bit-packed) in blocks and only in the selected interval
+    interval = slice(interval_start_time_frames, interval_end_time_frames)
+    interval_seconds = INTERVAL_END_TIME_SECONDS-INTERVAL_START_TIME_SECONDS
 
-        intosc_int_var = np.nan
-        if np.nan not in (inactivity_duration_std, avg_inactivity_duration):
-            intosc_int_var = inactivity_duration_std/avg_inactivity_duration
-        cell_data['interoscillation_int_var'].append(intosc_int_var)
+    cell_num = binarized_time_series.shape[1]
+    blocks = [activity_parameters(binarized_time_series[interval, start:start+CELL_BLOCK_SIZE],
+                                  sampling, interval_seconds)
+              for start in range(0, cell_num, CELL_BLOCK_SIZE)]
+    cell_data = {key: np.concatenate([block[key] for block in blocks]) for key in blocks[0]}
 
     avg_islet_values = {key: {} for key in cell_data}
     for key, value in cell_data.items():
@@ -88,13 +60,10 @@ def cell_activity_data(CONFIG_DATA: dict, binarized_time_series: np.array):
 
     with open(f'results/{EXPERIMENT_NAME}/cellular_activity_parameters.txt',
             'w', encoding='utf-8') as file:
-        print('RelActTime OscFreq AvgOscDur IOIV', file=file)
-        for i in range(cell_num):
-            act_time_i = cell_data['relative_active_times'][i]
-            freq_i = cell_data['oscillation_frequencies'][i]
-            dur_i = cell_data['avg_oscillation_durations'][i]
-            ioiv_i = cell_data['interoscillation_int_var'][i]
-            print(f'{act_time_i:.4f} {freq_i:.4f} {dur_i:.4f} {ioiv_i:.4f}', file=file)
+        lines = ['RelActTime OscFreq AvgOscDur IOIV']
+        for act_time_i, freq_i, dur_i, ioiv_i in zip(*(value.tolist() for value in cell_data.values())):
+            lines.append(f'{act_time_i:.4f} {freq_i:.4f} {dur_i:.4f} {ioiv_i:.4f}')
+        file.write('\n'.join(lines) + '\n')
 
 
     number_of_panels = len(cell_data.keys())
@@ -9,11 +9,9 @@ Correlation analysis of islet
 import os
 import matplotlib
 import numpy as np
-import matplotlib.cm as cm
 import matplotlib.pyplot as plt
 import seaborn as sns
 import networkx as nx
-from networkx.algorithms import clustering
 from helper_functions.network_funcs import (fixed_kavg_conn_mat,
                                             fixed_rth_conn_mat,
                                             construct_graph_from_conn_mat,
@@ -21,8 +19,9 @@ from helper_functions.network_funcs import (fixed_kavg_conn_mat,
                                             avg_deg,
                                             avg_cluss,
                                             max_struc,
-                                            small_world_coefficient,
-                                            commstructure, calculate_hindex)
+                                            commstructure)
+from helper_functions.node_metrics import node_metrics, save_node_metrics
+from helper_functions.null_models import small_world_ensemble
 from helper_functions.coactivity import coactivity
 from methods.plot_configurations import PANEL_WIDTH, PANEL_HEIGHT
 from methods import plot_configurations
@@ -38,6 +37,10 @@ def corr_ca_analysis_data(CONFIG_DATA: dict, time_series: np.array, pos: np.arra
     NETWORK_METHOD = CONFIG_DATA["NETWORK_METHOD"]
     CONNECTIVITY_LEVEL = CONFIG_DATA["CONNECTIVITY_LEVEL"]
     FIXED_KAVG_TOLERANCE = CONFIG_DATA["FIXED_KAVG_TOLERANCE"]
+    SMALL_WORLD_NULL_MODELS = CONFIG_DATA["SMALL_WORLD_NULL_MODELS"]
+    RANDOM_SEED = CONFIG_DATA["RANDOM_SEED"]
+    LOUVAIN_RESTARTS = CONFIG_DATA["LOUVAIN_RESTARTS"]
+    NUM_WORKERS = CONFIG_DATA["NUM_WORKERS"]
     EXPERIMENT_NAME = CONFIG_DATA["EXPERIMENT_NAME"]
     ############################################
     ###### Settings#################
@@ -91,8 +94,10 @@ def corr_ca_analysis_data(CONFIG_DATA: dict, time_series: np.array, pos: np.arra
         conn_mat = fixed_rth_conn_mat(corr_matrix, threshold_level)
         conn_th = threshold_level
     elif network_method == 'fixed_kavg':
-        conn_mat, Rth = fixed_kavg_conn_mat(corr_matrix, threshold_level, tolerance=FIXED_KAVG_TOLERANCE)
+        conn_mat, Rth, achieved_k = fixed_kavg_conn_mat(corr_matrix, threshold_level,
+                                                        tolerance=FIXED_KAVG_TOLERANCE)
         conn_th = Rth
+        print(f'Network constructed with threshold {Rth:.3f} (Kavg = {achieved_k:.3f}).')
     else:
         raise BaseException('Please select a valid network construction method (network_method).')
 
@@ -102,13 +107,15 @@ def corr_ca_analysis_data(CONFIG_DATA: dict, time_series: np.array, pos: np.arra
     avg_eff = efficiency(G)
     avg_k = avg_deg(G)
     avg_c = avg_cluss(G)
-    s_max = max_struc(G)/cell_num
-    sw_coef = small_world_coefficient(G)
+    s_max, components = max_struc(G, return_labels=True)
+    s_max = s_max/cell_num
+    sw_coef, sw_ci_low, sw_ci_high = small_world_ensemble(G, avg_c, avg_eff, SMALL_WORLD_NULL_MODELS,
+                                                          RANDOM_SEED, NUM_WORKERS)
     assortativity = nx.algorithms.degree_assortativity_coefficient(G)
-    num_comm, Q, communities = commstructure(G)
+    num_comm, Q, communities = commstructure(G, LOUVAIN_RESTARTS, RANDOM_SEED, NUM_WORKERS)
     node_sizes = [np.sqrt(G.degree(i))+3.0 for i in range(cell_num)]
     node_colors = []
-    cmap = cm.get_cmap('jet')
+    cmap = matplotlib.colormaps['jet']
     for i in range(cell_num):
         if G.degree(i) == 0:
             node_colors.append('lightgray')
@@ -122,9 +129,9 @@ def corr_ca_analysis_data(CONFIG_DATA: dict, time_series: np.array, pos: np.arra
     # pylint: disable-next=C0301
     with open(f'results/{EXPERIMENT_NAME}/{analysis_type}_analysis/{network_method}/average_{analysis_type}_network_parameters.txt',
             'w', encoding='utf-8') as file:
-        print(f'ConnTh {avg_corr_label} AvgEff AvgK AvgC Smax SwCoef Assort CommNum Q', file=file)
+        print(f'ConnTh {avg_corr_label} AvgEff AvgK AvgC Smax SwCoef Assort CommNum Q SwCILow SwCIHigh', file=file)
         # pylint: disable-next=C0301
-        print(f'{conn_th:.3f} {avg_corr:.3f} {avg_eff:.3f} {avg_k:.3f} {avg_c:.3f} {s_max:.3f} {sw_coef:.3f} {assortativity:.3f} {num_comm/cell_num:.3f} {Q:.3f}',
+        print(f'{conn_th:.3f} {avg_corr:.3f} {avg_eff:.3f} {avg_k:.3f} {avg_c:.3f} {s_max:.3f} {sw_coef:.3f} {assortativity:.3f} {num_comm/cell_num:.3f} {Q:.3f} {sw_ci_low:.3f} {sw_ci_high:.3f}',
             file=file)
     
     norm_pos = np.zeros(pos.shape, float)
@@ -156,28 +163,10 @@ def corr_ca_analysis_data(CONFIG_DATA: dict, time_series: np.array, pos: np.arra
                 dpi=600, bbox_inches='tight', pad_inches=0.01)
     plt.close(fig)
 
-    clustering_i = clustering(G)
-    closeness_centrality_i = nx.closeness_centrality(G)
-    degree_centrality_i = nx.degree_centrality(G)
-    betweeness_centrality_i = nx.betweenness_centrality(G)
-    avg_nn_degree_i = nx.average_neighbor_degree(G)
+    metrics = node_metrics(G, NUM_WORKERS)
     # pylint: disable-next=C0301
-    with open(f'results/{EXPERIMENT_NAME}/{analysis_type}_analysis/{network_method}/{analysis_type}_network_cell_parameters.txt',
-            'w', encoding='utf-8') as file:
-        print('k rel_k C Hindex CloseCent DegCent BetwCent AvgNNDeg Comm', file=file)
-        for i in range(cell_num):
-            k_i = G.degree(i)
-            rel_k_i = k_i/cell_num
-            clust_i = clustering_i[i]
-            hindex_i = calculate_hindex(G,i)
-            cls_cent_i = closeness_centrality_i[i]
-            k_cent_i = degree_centrality_i[i]
-            btw_cent_i = betweeness_centrality_i[i]
-            nn_deg_i = avg_nn_degree_i[i]
-            comm_i = communities[i]
-            # pylint: disable-next=C0301
-            print(f'{k_i} {rel_k_i:.3f} {clust_i:.3f} {hindex_i} {cls_cent_i:.3f} {k_cent_i:.3f} {btw_cent_i:.3f} {nn_deg_i:.3f} {comm_i}',
-                file=file)
+    save_node_metrics(f'results/{EXPERIMENT_NAME}/{analysis_type}_analysis/{network_method}/{analysis_type}_network_cell_parameters.txt',
+                      metrics, communities)
 
     fig = plt.figure(figsize=(PANEL_WIDTH, PANEL_WIDTH))
     ax = fig.add_subplot(1,1,1)
@@ -207,4 +196,7 @@ def corr_ca_analysis_data(CONFIG_DATA: dict, time_series: np.array, pos: np.arra
     # pylint: disable-next=C0301
     np.savetxt(f'results/{EXPERIMENT_NAME}/{analysis_type}_analysis/{network_method}/{analysis_type}_conn_mat.txt',
                conn_mat, fmt='%d')
+    # pylint: disable-next=C0301
+    np.savetxt(f'results/{EXPERIMENT_NAME}/{analysis_type}_analysis/{network_method}/{analysis_type}_components.txt',
+               components, fmt='%d')
     print(f'{analysis_type} analysis finished successfully.')
@@ -9,6 +9,9 @@ import matplotlib.pyplot as plt
 from matplotlib import gridspec
 from helper_functions.ploting_funcs import binarized_plot
 from helper_functions.exclude_cells import pick_exclude_cells
+from helper_functions.packed_binary import as_packed
+from helper_functions.artifact_store import save_artifact
+from helper_functions.utility_functions import is_interactive
 from methods.plot_configurations import PANEL_WIDTH
 
 
@@ -17,19 +20,27 @@ def exclude_data(CONFIG_DATA: dict, smoothed_data: np.ndarray,
                  response_times: np.ndarray) -> tuple:
     """
     Excludes bad data
+    In batch mode an existing excluded cells file is used
+    (if the file does not exist no cells are excluded)
     """
 
     SAMPLING = CONFIG_DATA["SAMPLING"]
     EXPERIMENT_NAME = CONFIG_DATA["EXPERIMENT_NAME"]
-    use_file = input('Use existing excluded cells file? (yes/no): ')
+    excluded_cells_path = f'preprocessing/{EXPERIMENT_NAME}/excluded_cells.txt'
+    if is_interactive():
+        use_file = input('Use existing excluded cells file? (yes/no): ')
+    else:
+        use_file = 'yes' if os.path.exists(excluded_cells_path) else 'no'
     excluded_cells = None
     if use_file.lower() == 'yes':
-        excluded_cells = list(np.loadtxt(f'preprocessing/{EXPERIMENT_NAME}/excluded_cells.txt'))
+        excluded_cells = list(np.atleast_1d(np.loadtxt(excluded_cells_path)))
         excluded_cells = set(excluded_cells) ##returns unordered collection of unique elements
         excluded_cells = list(excluded_cells) ##turns set to list type
         excluded_cells.sort() ##orders list of unique elements in ascending order
-    else:
+    elif is_interactive():
         excluded_cells = pick_exclude_cells(CONFIG_DATA, smoothed_data, binarized_data)
+    else:
+        excluded_cells = []
     ##Checks (and creates) folder structure
     if not os.path.exists(f'preprocessing/{EXPERIMENT_NAME}/results'):
         os.makedirs(f'preprocessing/{EXPERIMENT_NAME}/results')
@@ -40,7 +51,6 @@ def exclude_data(CONFIG_DATA: dict, smoothed_data: np.ndarray,
     number_of_remaining_cells = number_of_all_cells - number_of_excluded_cells
 
     final_smoothed_data = np.zeros((len(smoothed_data), number_of_remaining_cells), float)
-    final_binarized_data = np.zeros((len(binarized_data), number_of_remaining_cells), int)
     final_pos = np.zeros((number_of_remaining_cells, 2), float)
     final_response_times = np.zeros(number_of_remaining_cells, float)
 
@@ -48,7 +58,7 @@ def exclude_data(CONFIG_DATA: dict, smoothed_data: np.ndarray,
     remaining_cell_indexes = list(set(all_cell_indexes).difference(set(list(excluded_cells))))
 
     final_smoothed_data[:,:] = smoothed_data[:,remaining_cell_indexes]
-    final_binarized_data[:,:] = binarized_data[:,remaining_cell_indexes]
+    final_binarized_data = as_packed(binarized_data).select_cells(remaining_cell_indexes)
     final_pos[:,:] = pos[remaining_cell_indexes,:]
     if response_times is not None:
         final_response_times[:] = response_times[remaining_cell_indexes]
@@ -76,14 +86,14 @@ def exclude_data(CONFIG_DATA: dict, smoothed_data: np.ndarray,
     plt.close(fig)
 
     ##Saves final data
-    np.savetxt(f'preprocessing/{EXPERIMENT_NAME}/results/final_smoothed_traces.txt',
+    save_artifact(CONFIG_DATA, f'preprocessing/{EXPERIMENT_NAME}/results/final_smoothed_traces',
             final_smoothed_data, fmt='%.3lf')
-    np.savetxt(f'preprocessing/{EXPERIMENT_NAME}/results/final_binarized_traces.txt',
+    save_artifact(CONFIG_DATA, f'preprocessing/{EXPERIMENT_NAME}/results/final_binarized_traces',
             final_binarized_data, fmt='%d')
-    np.savetxt(f'preprocessing/{EXPERIMENT_NAME}/results/final_coordinates.txt',
+    save_artifact(CONFIG_DATA, f'preprocessing/{EXPERIMENT_NAME}/results/final_coordinates',
             final_pos, fmt='%.1lf')
     if response_times is not None:
-        np.savetxt(f'preprocessing/{EXPERIMENT_NAME}/results/final_first_responder_times.txt',
+        save_artifact(CONFIG_DATA, f'preprocessing/{EXPERIMENT_NAME}/results/final_first_responder_times',
                 final_response_times, fmt='%.1lf')
 
     fig = binarized_plot(time, final_binarized_data, final_pos)
@@ -91,8 +101,7 @@ def exclude_data(CONFIG_DATA: dict, smoothed_data: np.ndarray,
                 dpi=200,bbox_inches = 'tight')
     plt.close(fig)
 
-    np.savetxt(f'preprocessing/{EXPERIMENT_NAME}/excluded_cells.txt',
-               excluded_cells, fmt='%d')
+    np.savetxt(excluded_cells_path, excluded_cells, fmt='%d')
 
     if response_times is None:
         final_response_times = None
@@ -6,9 +6,9 @@ Time series filtration
 # pylint: disable=R0915, R0914
 import os
 import numpy as np
-import matplotlib.pyplot as plt
-from helper_functions.utility_functions import print_progress_bar
 from helper_functions.filters import FFTFilter, Filter
+from helper_functions.artifact_store import save_artifact
+from helper_functions.cell_figures import render_cell_figures
 from methods import plot_configurations
 
 def filter_data(CONFIG_DATA: dict, data: np.array, pos: np.array) -> np.array:
@@ -44,48 +44,49 @@ def filter_data(CONFIG_DATA: dict, data: np.array, pos: np.array) -> np.array:
     if not os.path.exists(f'preprocessing/{EXPERIMENT_NAME}/filt_traces'):
         os.makedirs(f'preprocessing/{EXPERIMENT_NAME}/filt_traces')
 
-    filtered_series = np.zeros((len(data), number_of_cells), float)
-
-    for ts_num in range(number_of_cells):
-        cut_signal = None
-        if filter_type == 'analog':
-            signal_filter = Filter(data[:,ts_num], SAMPLING)
-            cut_signal = signal_filter.bandpass(low_frequency, high_frequency)
-        elif filter_type == 'fft':
-            signal_filter = FFTFilter(data[:,ts_num], time)
-            signal_filter.find_fftfreq()
-            signal_filter.rfft()
-            signal_filter.bandpass_filt(low_frequency, high_frequency)
-            cut_signal = signal_filter.get_filtered_signal()
-
-        print_progress_bar(ts_num+1, number_of_cells, f'Filtering time series {ts_num} ')
-
-        fig, (ax1, ax2, ax3) = plt.subplots(3, 1)
-        ax1.set_title('Raw signal')
-        ax1.plot(time, data[:,ts_num], linewidth=0.5, color='dimgrey')
-        ax1.set_ylabel('Signal (a.u)')
-
-        ax2.set_title('Raw signal outtake')
-        ax2.plot(time, data[:, ts_num], linewidth=0.67, color='dimgrey')
-        ax2.set_xlim([INTERVAL_START_TIME_SECONDS, INTERVAL_END_TIME_SECONDS])
-        ax2.set_ylabel('Signal (a.u)')
-
-        ax3.set_title('Filtered signal outtake')
-        ax3.plot(time, cut_signal, linewidth=0.67, color='dimgrey')
-        ax3.set_xlim([INTERVAL_START_TIME_SECONDS, INTERVAL_END_TIME_SECONDS])
-        ax3.set_ylabel('Signal (a.u)')
-        ax3.set_xlabel('time (s)')
-        plt.subplots_adjust(hspace=0.6)
-        fig.savefig(
-            f"preprocessing/{EXPERIMENT_NAME}/filt_traces/cell_{ts_num}.jpg",
-            dpi=200, bbox_inches='tight')
-        plt.close(fig)
+    filtered_series = None
+    if filter_type == 'analog':
+        ###Filters all time series at once along the time axis
+        print('Filtering time series...')
+        signal_filter = Filter(data, SAMPLING)
+        filtered_series = signal_filter.bandpass(low_frequency, high_frequency)
+    elif filter_type == 'fft':
+        ###Filters all time series at once along the time axis
+        print('Filtering time series...')
+        signal_filter = FFTFilter(data, time)
+        signal_filter.find_fftfreq()
+        signal_filter.rfft()
+        signal_filter.bandpass_filt(low_frequency, high_frequency)
+        filtered_series = signal_filter.get_filtered_signal()
+    else:
+        # pylint: disable-next=W0719
+        raise BaseException('Please select a valid filter type (FILTER_SELECTION).')
 
-        cut_signal[:] = (cut_signal[:] - np.min(cut_signal[:])) / \
-            (np.max(cut_signal[:]) - np.min(cut_signal[:]))
+    ###Min-max normalization of all time series (columns) in one pass
+    min_values = np.min(filtered_series, axis=0)
+    max_values = np.max(filtered_series, axis=0)
+    normalized_series = (filtered_series - min_values) / (max_values - min_values)
 
-        filtered_series[:,ts_num] = cut_signal
+    save_artifact(CONFIG_DATA, f'preprocessing/{EXPERIMENT_NAME}/filtered_traces',
+                  normalized_series, fmt='%.3lf')
 
-    np.savetxt(f'preprocessing/{EXPERIMENT_NAME}/filtered_traces.txt',
-               filtered_series, fmt='%.3lf')
-    return filtered_series
+    ###Figures of the raw and filtered (not normalized) time series
+    interval = (INTERVAL_START_TIME_SECONDS, INTERVAL_END_TIME_SECONDS)
+    layout = {
+        'name': 'filtered_traces',
+        'folder': f'preprocessing/{EXPERIMENT_NAME}/filt_traces',
+        'file': 'cell_{cell}.jpg',
+        'panels': [
+            {'title': 'Raw signal', 'ylabel': 'Signal (a.u)', 'xlim': None,
+             'lines': [('raw', 'dimgrey', 0.5)]},
+            {'title': 'Raw signal outtake', 'ylabel': 'Signal (a.u)', 'xlim': interval,
+             'lines': [('raw', 'dimgrey', 0.67)]},
+            {'title': 'Filtered signal outtake', 'ylabel': 'Signal (a.u)', 'xlim': interval,
+             'xlabel': 'time (s)', 'lines': [('filtered', 'dimgrey', 0.67)]}
+        ],
+        'hspace': 0.6,
+        'savefig': {'dpi': 200, 'bbox_inches': 'tight'}
+    }
+    render_cell_figures(CONFIG_DATA, layout, time, {'raw': data, 'filtered': filtered_series},
+                        prefix='Plotting filtered time series')
+    return normalized_series
@@ -10,6 +10,7 @@ import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Cursor
+from helper_functions.artifact_store import save_artifact
 from methods.plot_configurations import PANEL_HEIGHT, MEDIAN_PROPS, BOX_PROPS
 from methods import plot_configurations
 
@@ -102,8 +103,8 @@ def first_responder_data(CONFIG_DATA: dict, data: np.ndarray):
         plt.show()
         current_cell = click_params['next_cell'] + 1
     plt.close()
-    np.savetxt(f'preprocessing/{EXPERIMENT_NAME}/first_responder_times.txt',
-               response_times, fmt='%.2lf')
+    save_artifact(CONFIG_DATA, f'preprocessing/{EXPERIMENT_NAME}/first_responder_times',
+                  response_times, fmt='%.2lf')
 
     valid_times = response_times[~np.isnan(response_times)]
     fig=plt.figure(figsize=(PANEL_HEIGHT, PANEL_HEIGHT))
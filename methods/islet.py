@@ -9,14 +9,20 @@ import numpy as np
 from methods.filt_traces import filter_data
 from methods.smooth_traces import smooth_data
 from methods.binarization import binarize_data
-from methods.bin_traces_old import signal_binarization
+from methods.bin_traces_old import signal_binarization, fast_signal_binarization
 from methods.exclude_cells import exclude_data
 from methods.corr_ca_analysis import corr_ca_analysis_data
 from methods.cell_parameter_analysis import cell_activity_data
 from methods.first_responders import first_responder_data
-from methods.wave_detection import wave_detection, wave_characterization, wave_raster_plot, cells_in_waves_analysis
-from helper_functions.utility_functions import (save_config_data, create_sample_config,
-                                                load_existing_data, validate_config_data, catch_error)
+from methods.wave_detection import (wave_detection, wave_detection_streaming, wave_characterization,
+                                    wave_raster_plot, cells_in_waves_analysis, STREAMING_CHUNK_FRAMES)
+from helper_functions.packed_binary import as_packed
+from helper_functions.wave_tracking import frame_chunks
+from helper_functions.artifact_store import load_raw_data, load_artifact
+from helper_functions.stage_cache import cached_stage
+from helper_functions.utility_functions import (save_config_data, create_sample_config, complete_config_data,
+                                                load_existing_data, validate_config_data, catch_error,
+                                                step_error)
 
 # pylint: disable-next=R0902
 class Islet:
@@ -67,11 +73,17 @@ class Islet:
             with open('configurations.txt', encoding='utf-8') as file:
                 config_data = file.read()
                 config_data = json.loads(config_data)
-                if validate_config_data(config_data):
-                    self.configs = config_data
-                else:
-                    print('Configurations file had missing fields and was replaced with default!')
-                    self.create_and_load_sample_config_data()
+            added_fields = complete_config_data(config_data)
+            if validate_config_data(config_data):
+                self.configs = config_data
+                if added_fields:
+                    # pylint: disable-next=C0301
+                    print(f'Configurations file was completed with default values of new fields: {", ".join(added_fields)}')
+                    with open('configurations.txt', 'w', encoding='utf-8') as file:
+                        json.dump(config_data, file, indent=4)
+            else:
+                print('Configurations file had missing fields and was replaced with default!')
+                self.create_and_load_sample_config_data()
         except FileNotFoundError:
             self.create_and_load_sample_config_data()
 
@@ -90,6 +102,8 @@ class Islet:
         save_config_data(self.configs)
 
     @catch_error()
+    @cached_stage(inputs=['raw_data', 'positions'], outputs=['filtered_traces'],
+                  config_keys=['FILTER_SELECTION', 'LOW_FREQUENCY_CUTOFF', 'HIGH_FREQUENCY_CUTOFF'])
     def filter_traces(self):
         """
         Calls filter function with current configs
@@ -99,9 +113,11 @@ class Islet:
                                             self.raw_data,
                                             self.positions)
         else:
-            print(self.raw_data_missing_error)
+            step_error(self.raw_data_missing_error)
 
     @catch_error()
+    @cached_stage(inputs=['filtered_traces'], outputs=['smoothed_traces'],
+                  config_keys=['SMOOTHING_POINTS', 'SMOOTHING_REPEATS'])
     def smooth_traces(self):
         """
         Calls smoothing function with current configs
@@ -110,9 +126,13 @@ class Islet:
             self.smoothed_traces = smooth_data(self.configs,
                                                self.filtered_traces)
         else:
-            print('Please perform the filtration step first!')
+            step_error('Please perform the filtration step first!')
 
     @catch_error()
+    #binarization also normalizes smoothed traces in place
+    @cached_stage(inputs=['smoothed_traces', 'positions'],
+                  outputs=['binarized_traces', 'smoothed_traces'],
+                  config_keys=['BINARIZATION'])
     def binarize_traces(self):
         """
         Calls binarization function
@@ -120,18 +140,20 @@ class Islet:
         #Availale methods for binarization
         methods = {
             'SLOPE_METHOD': signal_binarization,
+            'SLOPE_METHOD_VECTORIZED': fast_signal_binarization,
             'PROMINENCE_METHOD': binarize_data
         }
         #Selected method for binarization
         selected_method = self.configs['BINARIZATION']['USE']
         if self.smoothed_traces is not None:
             if selected_method in methods:
-                self.binarized_traces = methods[selected_method](self.configs,
+                binarized_traces = methods[selected_method](self.configs,
                                                             self.smoothed_traces, self.positions)
+                self.binarized_traces = as_packed(binarized_traces)
             else:
-                print('Please select a valid binarization method')
+                step_error('Please select a valid binarization method')
         else:
-            print('Please perform the smoothing step first!')
+            step_error('Please perform the smoothing step first!')
 
     @catch_error()
     def exclude_traces(self):
@@ -152,9 +174,14 @@ class Islet:
             self.final_first_responder_times = final_resp_times
 
         else:
-            print(self.perform_preprocess_steps_first_error)
+            step_error(self.perform_preprocess_steps_first_error)
 
     @catch_error()
+    @cached_stage(inputs=['final_smoothed_traces', 'final_binarized_traces', 'final_coordinates'],
+                  outputs=[],
+                  config_keys=['ANALYSIS_TYPE', 'NETWORK_METHOD', 'CONNECTIVITY_LEVEL',
+                               'FIXED_KAVG_TOLERANCE', 'SMALL_WORLD_NULL_MODELS', 'RANDOM_SEED',
+                               'LOUVAIN_RESTARTS'])
     def corr_coact_analysis(self):
         """
         Calls corr/coact network analysis
@@ -164,9 +191,10 @@ class Islet:
                 'ANALYSIS_TYPE'] == 'coactivity' else self.final_smoothed_traces
             corr_ca_analysis_data(self.configs, time_series, self.final_coordinates)
         else:
-            print(self.perform_preprocess_steps_first_error)
+            step_error(self.perform_preprocess_steps_first_error)
 
     @catch_error()
+    @cached_stage(inputs=['final_binarized_traces'], outputs=[], config_keys=[])
     def cell_activity_analysis(self):
         """
         Calls call activity parameter data analysis
@@ -174,7 +202,7 @@ class Islet:
         if self.final_binarized_traces is not None:
             cell_activity_data(self.configs, self.final_binarized_traces)
         else:
-            print(self.perform_preprocess_steps_first_error)
+            step_error(self.perform_preprocess_steps_first_error)
 
     @catch_error()
     def first_responder_analysis(self):
@@ -184,28 +212,44 @@ class Islet:
         if self.raw_data is not None:
             self.first_responder_times = first_responder_data(self.configs, self.raw_data)
         else:
-            print(self.raw_data_missing_error)
+            step_error(self.raw_data_missing_error)
 
     @catch_error()
+    @cached_stage(inputs=['final_binarized_traces', 'final_coordinates'],
+                  outputs=['wave_act_sig', 'wave_characteristics', 'wave_raster_plot'],
+                  config_keys=['COORDINATE_TRANSFORM', 'WAVES'])
     def wave_anaylsis(self):
         """
         Performs wave detection analysis
         Test change
         """
-        if self.final_binarized_traces is not None:
+        activations = None
+        if self.final_binarized_traces is not None and self.configs['WAVES']['STREAMING']:
+            #act_sig is only saved to file (it is not kept in memory) and binarized
+            #traces are read from the memory-mapped file by frame ranges
+            self.wave_act_sig = None
+            binarized_traces, _ = load_artifact(
+                f'preprocessing/{self.configs["EXPERIMENT_NAME"]}/results/final_binarized_traces')
+            if binarized_traces is None:
+                binarized_traces = self.final_binarized_traces
+            chunks = frame_chunks(binarized_traces, STREAMING_CHUNK_FRAMES)
+            self.wave_characteristics, activations = wave_detection_streaming(
+                self.configs, chunks, self.final_coordinates, len(binarized_traces))
+        elif self.final_binarized_traces is not None:
             self.wave_act_sig = wave_detection(self.configs, self.final_binarized_traces, self.final_coordinates)
         else:
-            print(self.perform_preprocess_steps_first_error)
+            step_error(self.perform_preprocess_steps_first_error)
         
         if self.wave_act_sig is not None:
             self.wave_characteristics = wave_characterization(self.configs, self.wave_act_sig)
-        else:
-            print('Please perform wave detection step first.')
+        elif activations is None:
+            step_error('Please perform wave detection step first.')
         
         if self.wave_characteristics is not None:
-            self.wave_raster_plot = wave_raster_plot(self.configs, self.wave_act_sig, self.wave_characteristics)
+            self.wave_raster_plot = wave_raster_plot(self.configs, self.wave_act_sig, self.wave_characteristics,
+                                                     activations)
         else:
-            print('Please perform wave detection step first.')
+            step_error('Please perform wave detection step first.')
         if self.wave_raster_plot is not None:
             cells_in_waves_analysis(self.configs, self.wave_raster_plot, self.final_coordinates)
 
@@ -242,9 +286,11 @@ class Islet:
             raw_data_path = os.path.join(self.configs["RAW_DATA_FOLDER"],
                                          self.configs["RAW_DATA_NAME"])
 
-            raw_data = np.loadtxt(raw_data_path)
+            #parsed once, then memory-mapped from the binary sidecar
+            raw_data = load_raw_data(raw_data_path)
 
             if self.configs['FIRST_COLUMN_TIME']:
+                #view of the memory-mapped data (no copy)
                 raw_data = raw_data[:,1:]
 
             raw_positions_path = os.path.join(self.configs["RAW_DATA_FOLDER"],
@@ -264,6 +310,10 @@ class Islet:
         data, loaded_data = load_existing_data(self.configs)
         for key, value in data.items():
             setattr(self, key, value)
+        #binarized traces are kept bit-packed
+        for key in ['binarized_traces', 'final_binarized_traces']:
+            if getattr(self, key) is not None:
+                setattr(self, key, as_packed(getattr(self, key)))
         preprocess_data_msg = '\n'.join(loaded_data)
         print(preprocess_data_msg)
         print('\n')
@@ -290,7 +340,11 @@ class Islet:
             preprocessing_final_data_list = ['final_smoothed_traces.txt',
                                        'final_binarized_traces.txt',
                                         'final_coordinates.txt',
-                                        'final_response_times.txt']
+                                        'final_response_times.txt',
+                                        'final_smoothed_traces.npy',
+                                        'final_binarized_traces.npz',
+                                        'final_coordinates.npy',
+                                        'final_first_responder_times.npy']
             for data_name in preprocessing_final_data_list:
                 try:
                     # pylint: disable-next=C0301
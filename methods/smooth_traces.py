@@ -7,9 +7,9 @@ Time series smoothing
 
 import os
 import numpy as np
-import matplotlib.pyplot as plt
-from helper_functions.smoothing import smooth_ts
-from helper_functions.utility_functions import print_progress_bar
+from helper_functions.smoothing import smooth_ts_matrix
+from helper_functions.artifact_store import save_artifact
+from helper_functions.cell_figures import render_cell_figures
 from methods import plot_configurations
 
 def smooth_data(CONFIG_DATA: dict, data: np.array) -> np.array:
@@ -38,37 +38,30 @@ def smooth_data(CONFIG_DATA: dict, data: np.array) -> np.array:
     cell_num = len(data[0]) #number of cells
 
     time = [i/SAMPLING for i in range(len(data))]
-    smoothed_data = np.zeros((len(data), len(data[0])), float)
 
     if not os.path.exists(f'preprocessing/{EXPERIMENT_NAME}/smoothed_traces'):
         os.makedirs(f'preprocessing/{EXPERIMENT_NAME}/smoothed_traces')
 
-    for i in range(cell_num):
-        print_progress_bar(i+1, cell_num, f'Smoothing time series {i} ')
+    print('Smoothing time series...')
+    smoothed_data = smooth_ts_matrix(data, number_of_points, number_of_smoothings)
 
-        fig, (ax1, ax2) = plt.subplots(2, 1)
+    save_artifact(CONFIG_DATA, f'preprocessing/{EXPERIMENT_NAME}/smoothed_traces',
+                  smoothed_data, fmt='%.3lf')
 
-        ax1.set_title(f'Cell {i}')
-        ax1.plot(time, data[:, i], linewidth=0.5, color='dimgrey')
-        ax1.set_title('Filtered data')
-        ax1.set_xlim(start_time_seconds, end_time_seconds)
-        ax1.set_ylabel('Signal (a.u.)')
-
-        smoothed_data[:, i] = smooth_ts(data[:, i],
-                                        number_of_points,
-                                        number_of_smoothings)
-
-        ax2.plot(time, smoothed_data[:, i], linewidth=0.5, color='dimgrey')
-        ax2.set_title('Smoothed data')
-        ax2.set_xlim(start_time_seconds, end_time_seconds)
-        ax2.set_xlabel('time (s)')
-        ax2.set_ylabel('Signal (a.u.)')
-
-        plt.subplots_adjust(hspace=0.3)
-        fig.savefig(
-            f'preprocessing/{EXPERIMENT_NAME}/smoothed_traces/smoothed_trace_{i}.png',
-            dpi=200, bbox_inches='tight')
-        plt.close(fig)
-
-    np.savetxt(f'preprocessing/{EXPERIMENT_NAME}/smoothed_traces.txt', smoothed_data, fmt='%.3lf')
+    interval = (start_time_seconds, end_time_seconds)
+    layout = {
+        'name': 'smoothed_traces',
+        'folder': f'preprocessing/{EXPERIMENT_NAME}/smoothed_traces',
+        'file': 'smoothed_trace_{cell}.png',
+        'panels': [
+            {'title': 'Filtered data', 'ylabel': 'Signal (a.u.)', 'xlim': interval,
+             'lines': [('filtered', 'dimgrey', 0.5)]},
+            {'title': 'Smoothed data', 'ylabel': 'Signal (a.u.)', 'xlim': interval,
+             'xlabel': 'time (s)', 'lines': [('smoothed', 'dimgrey', 0.5)]}
+        ],
+        'hspace': 0.3,
+        'savefig': {'dpi': 200, 'bbox_inches': 'tight'}
+    }
+    render_cell_figures(CONFIG_DATA, layout, time, {'filtered': data, 'smoothed': smoothed_data},
+                        prefix='Plotting smoothed time series')
     return smoothed_data
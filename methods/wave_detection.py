@@ -7,23 +7,23 @@ Wave detection
 import os
 import numpy as np
 import pandas as pd
-from scipy.spatial import distance
-from scipy.stats import rankdata
 import matplotlib.pyplot as plt
 from helper_functions.utility_functions import print_progress_bar
+from helper_functions.packed_binary import as_packed
+from helper_functions.wave_tracking import (neighbour_lists, track_waves, WaveTracker,
+                                            first_activations, event_table,
+                                            group_min_ranks, group_percentiles)
 from methods import plot_configurations
 from methods.plot_configurations import PANEL_HEIGHT, MEDIAN_PROPS, BOX_PROPS
 
+#Number of frames of one chunk of the streaming wave detection
+STREAMING_CHUNK_FRAMES = 1000
+EVENTS_PARAMETERS_HEADER = 'start_frame end_frame duration event_number act_cell_num rel_act_cell_num'
+
 def wave_detection(CONFIG_DATA: dict, binarized_time_series: np.array, pos: np.array) -> np.array:
     """
     Performs wave detection
     """
-    def cellular_neighbours(dist: np.array):
-        """
-        Finds cell indicies of neighbours
-        """
-        return np.where((dist<Dth) & (dist!=0))[0]
-
     # INTERVAL_START_TIME_SECONDS = CONFIG_DATA["INTERVAL_START_TIME_SECONDS"]
     # INTERVAL_END_TIME_SECONDS = CONFIG_DATA["INTERVAL_END_TIME_SECONDS"]
     sampling = CONFIG_DATA["SAMPLING"]
@@ -34,60 +34,84 @@ def wave_detection(CONFIG_DATA: dict, binarized_time_series: np.array, pos: np.a
         os.makedirs(folder_path)
 
     FRAME_TH = int(CONFIG_DATA['WAVES']['TIME_TH_SECONDS']*sampling)
-    Dth = CONFIG_DATA['WAVES']['DISTANCE_TH']
 
     # interval_start_time_frames = int(INTERVAL_START_TIME_SECONDS*sampling)
     # interval_end_time_frames = int(INTERVAL_END_TIME_SECONDS*sampling)
     pos = pos * CONFIG_DATA["COORDINATE_TRANSFORM"]
-    distances = distance.cdist(pos, pos, 'euclidean')
     
     #Dth = np.average(distances) - np.std(distances)
     Dth = CONFIG_DATA["WAVES"]["DISTANCE_TH"]
     
-    neighbours = [cellular_neighbours(distances[:,i]) for i in range(len(pos))]
+    #neighbour pairs are found once with a k-d tree (no dense distance matrix)
+    neighbours = neighbour_lists(pos, Dth)
 
-    nonzero_lines = np.where(binarized_time_series==1)[0]
-    active_cells_in_frames = {line: list(np.where(binarized_time_series[line,:]==1)[0]) for line in nonzero_lines}
+    # binarized time series is kept bit-packed, only the needed frames are unpacked
+    binarized_time_series = as_packed(binarized_time_series)
     print('Wave detection analysis started...')
-    event_nums = []
     act_sig = np.zeros(binarized_time_series.shape, int)
-    max_event_number = 0
-    for i, frame in enumerate(active_cells_in_frames):
-        print_progress_bar(i+1, len(active_cells_in_frames.keys()), f'Analyzing frame {frame}')
-        k = max_event_number + 1
-        if i == 0:
-            act_sig[frame, active_cells_in_frames[frame]] = [k+i for i in range(len(active_cells_in_frames[frame]))]
-
-            for cell_i in active_cells_in_frames[frame]:
-                for cell_j in list(set(neighbours[cell_i]).intersection(set(active_cells_in_frames[frame]))):
-                    act_sig[frame, cell_i] = min(act_sig[frame, cell_i], act_sig[frame, cell_j])
-                    act_sig[frame, cell_j] = act_sig[frame, cell_i]
-        else:
-            act_sig[frame, active_cells_in_frames[frame]] = [k+i if act_sig[frame-1,active_cells_in_frames[frame][j]]==0 else act_sig[frame-1,active_cells_in_frames[frame][j]] for j in range(len(active_cells_in_frames[frame]))]
-            
-            for cell_i in active_cells_in_frames[frame]:
-                for cell_j in list(set(neighbours[cell_i]).intersection(set(active_cells_in_frames[frame]))):
-                    if(act_sig[frame, cell_i]!=0 and act_sig[frame, cell_j]!=0
-                       and act_sig[frame-1, cell_i]!=0 and np.sum(binarized_time_series[frame-FRAME_TH:frame+1,cell_i])<=FRAME_TH
-                       and act_sig[frame-1,cell_j]==0 and cell_i!=cell_j):
-                        act_sig[frame,cell_j]=act_sig[frame,cell_i]
-                    elif(act_sig[frame,cell_i]!=0 and act_sig[frame,cell_j]!=0 and act_sig[frame-1,cell_i]==0 and act_sig[frame-1,cell_j]!=0
-                         and np.sum(binarized_time_series[frame-FRAME_TH:frame+1,cell_j])<=FRAME_TH and cell_i!=cell_j):
-                        act_sig[frame,cell_i]=act_sig[frame,cell_j]
-                    elif(act_sig[frame,cell_i]!=0 and act_sig[frame,cell_j]!=0 and act_sig[frame-1,cell_i]==0
-                         and act_sig[frame-1,cell_j]==0 and cell_i!=cell_j):
-                        act_sig[frame,cell_i]=min(act_sig[frame,cell_i],act_sig[frame,cell_j])
-                        act_sig[frame,cell_j]=act_sig[frame,cell_i]
-
-        unique_new = np.unique(act_sig[frame,:])
-        event_nums = list(set(event_nums).union(set(unique_new)))
-        max_event_number = max(event_nums)
-    all_event_numbers = np.unique(act_sig[act_sig!=0])
-    for i, event_num in enumerate(all_event_numbers):
-        act_sig[np.where(act_sig==event_num)] = i+1
+    track_waves(binarized_time_series, neighbours, FRAME_TH, act_sig)
     np.savetxt(f'{folder_path}/act_sig.txt', act_sig,fmt='%d')
     return act_sig
 
+def wave_detection_streaming(CONFIG_DATA: dict, chunks, pos: np.array, frame_num: int = None) -> tuple:
+    """
+    Performs wave detection on consecutive chunks of binarized frames (e.g. from a long
+    or live recording). Only the state of the last frames is kept in memory, act_sig is
+    written to file chunk by chunk and waves are characterized as soon as they are completed.
+    Returns characteristics of waves (as wave_characterization) and first activations
+    (frames, cells, events) of cells in these waves.
+    """
+    sampling = CONFIG_DATA["SAMPLING"]
+    EXPERIMENT_NAME = CONFIG_DATA["EXPERIMENT_NAME"]
+    SIZE_TH = CONFIG_DATA["WAVES"]["REL_SIZE_THRESHOLD"]
+    folder_path = f'results/{EXPERIMENT_NAME}/waves'
+    if not os.path.exists(folder_path):
+        os.makedirs(folder_path)
+
+    FRAME_TH = int(CONFIG_DATA['WAVES']['TIME_TH_SECONDS']*sampling)
+    pos = pos * CONFIG_DATA["COORDINATE_TRANSFORM"]
+    Dth = CONFIG_DATA["WAVES"]["DISTANCE_TH"]
+    neighbours = neighbour_lists(pos, Dth)
+    cell_num = len(pos)
+    tracker = WaveTracker(neighbours, FRAME_TH, frame_num)
+
+    characteristics = []
+    activations = []
+    def add_events(completed: list):
+        for event_number, start_frame, end_frame, first_frames in completed:
+            act_cell_num = len(first_frames)
+            if act_cell_num/cell_num > SIZE_TH:
+                characteristics.append((start_frame, end_frame, end_frame-start_frame,
+                                        event_number, act_cell_num, act_cell_num/cell_num))
+                activations.extend((frame, cell, event_number) for cell, frame in first_frames.items())
+
+    print('Wave detection analysis started (streaming)...')
+    with open(f'{folder_path}/act_sig.txt', 'w', encoding='utf-8') as file:
+        for chunk in chunks:
+            act_sig, completed = tracker.add_chunk(chunk)
+            np.savetxt(file, act_sig, fmt='%d')
+            add_events(completed)
+            if frame_num is not None:
+                print_progress_bar(tracker.next_frame, frame_num, f'Analyzing frame {tracker.next_frame-1}')
+    add_events(tracker.finish())
+
+    #waves in the order of event numbers
+    characteristics = np.array(sorted(characteristics, key=lambda wave: wave[3]), float).reshape(-1, 6)
+    save_events_parameters(f'{folder_path}/events_parameters.txt', characteristics, cell_num)
+    activations = np.array(activations, int).reshape(-1, 3)
+    return characteristics, (activations[:,0], activations[:,1], activations[:,2])
+
+def save_events_parameters(path: str, characteristics: np.ndarray, cell_num: int):
+    """
+    Saves parameters of waves (characteristics) in one write
+    """
+    lines = [EVENTS_PARAMETERS_HEADER]
+    for start_frame, end_frame, duration, event_number, act_cell_num, _ in characteristics.astype(int).tolist():
+        # pylint: disable-next=C0301
+        lines.append(f'{start_frame} {end_frame} {duration} {event_number} {act_cell_num} {act_cell_num/cell_num}')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines) + '\n')
+
 def wave_characterization(CONFIG_DATA: dict, act_sig: np.array):
     """
     Characterizes waves according to threshold size
@@ -95,30 +119,26 @@ def wave_characterization(CONFIG_DATA: dict, act_sig: np.array):
     print('Characterizing detected waves...')
     EXPERIMENT_NAME = CONFIG_DATA["EXPERIMENT_NAME"]
     SIZE_TH = CONFIG_DATA["WAVES"]["REL_SIZE_THRESHOLD"]
-    events = [int(e) for e in np.unique(act_sig[act_sig!=0])]
     cell_num = len(act_sig[0])
     folder_path = f'results/{EXPERIMENT_NAME}/waves'
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
-    characteristics = np.zeros((0, 6), float)
-    file = open(f'{folder_path}/events_parameters.txt', 'w', encoding='utf-8')
-    print('start_frame end_frame duration event_number act_cell_num rel_act_cell_num', file=file)
-
-    for kkk, event in enumerate(events):
-        frames, cells = np.where(act_sig==event)
-        act_cell_num = len(np.unique(cells))
-        start_frame = np.amin(frames)
-        end_frame = np.amax(frames)
-        duration = end_frame - start_frame
-        if(act_cell_num/cell_num > SIZE_TH):
-            print(start_frame, end_frame, duration, kkk+1, act_cell_num, act_cell_num/cell_num, file=file)
-            characteristics = np.vstack((characteristics, np.array([start_frame, end_frame, duration, event, act_cell_num, act_cell_num/cell_num])))
-    file.close()
+    events, start_frames, end_frames, cell_counts = event_table(act_sig)
+    durations = end_frames - start_frames
+    rel_cell_counts = cell_counts/cell_num
+    selected = np.flatnonzero(rel_cell_counts > SIZE_TH)
+
+    characteristics = np.column_stack((start_frames, end_frames, durations, events,
+                                       cell_counts, rel_cell_counts))[selected].astype(float)
+    save_events_parameters(f'{folder_path}/events_parameters.txt', characteristics, cell_num)
     return characteristics
 
-def wave_raster_plot(CONFIG_DATA: dict, act_sig: np.array, characteristics: np.array) -> np.ndarray:
+def wave_raster_plot(CONFIG_DATA: dict, act_sig: np.array, characteristics: np.array,
+                     activations: tuple = None) -> np.ndarray:
     """
-    Computes and plots waves rasterplot
+    Computes and plots waves rasterplot.
+    First activations (frames, cells, events) of cells in waves are found in act_sig
+    if they are not given (streaming wave detection).
     """
     print('Creating wave raster plot...')
     EXPERIMENT_NAME = CONFIG_DATA["EXPERIMENT_NAME"]
@@ -127,33 +147,34 @@ def wave_raster_plot(CONFIG_DATA: dict, act_sig: np.array, characteristics: np.a
         os.makedirs(folder_path)
 
     sampling = CONFIG_DATA["SAMPLING"]
-    rast_plot = []
-    for kkk in range(len(characteristics)):
-        start_time = int(characteristics[kkk,0])
-        end_time = int(characteristics[kkk,1])
-        event_num = int(characteristics[kkk,3])
-        rnd_num = np.random.randint(1, 600)
-        used = []
-        for i in range(start_time, end_time+1, 1):
-            for j in range(len(act_sig[0])):
-                if act_sig[i,j]==event_num and j not in used:
-                    rast_plot.append((((i)/sampling), ((i-start_time)/sampling), 0, j, event_num, rnd_num, characteristics[kkk,4]))
-                    used.append(j)
-
-    rast_plot = np.array(rast_plot, float)
-    all_event_numbers = np.unique(rast_plot[:,4])
-    for event_num in all_event_numbers:
-        act_times = rast_plot[np.where(rast_plot[:,4]==event_num)][:,1] #act_delays
-        ranks = rankdata(act_times, 'min')
-        rast_plot[np.where(rast_plot[:,4]==event_num)[0],2] = ranks
-        
-    file = open(f'{folder_path}/raster_plot.txt', 'w', encoding='utf-8')
-    print('start_time act_delay act_rank cell event_num rnd_event_num rel_event_size', file=file)
-    for i in range(len(rast_plot)):
-        print(rast_plot[i,0], rast_plot[i,1], rast_plot[i,2], int(rast_plot[i,3]), rast_plot[i,4], rast_plot[i,5], rast_plot[i,6], file=file)
-    file.close()
-
-    cmap=plt.cm.get_cmap('jet_r')
+    start_times = characteristics[:,0].astype(int)
+    end_times = characteristics[:,1].astype(int)
+    event_numbers = characteristics[:,3].astype(int)
+    rnd_nums = np.array([np.random.randint(1, 600) for _ in range(len(characteristics))], float)
+
+    #first activation frame of every cell in every event and its characteristics row
+    if activations is None:
+        activations = first_activations(act_sig, event_numbers, start_times, end_times)
+    frames, cells, events = activations
+    event_rows = np.full(int(np.amax(event_numbers, initial=0))+1, -1)
+    event_rows[event_numbers] = np.arange(len(event_numbers))
+    rows = event_rows[events]
+    order = np.lexsort((cells, frames, rows))
+    frames, cells, rows = frames[order], cells[order], rows[order]
+
+    rast_plot = np.column_stack((frames/sampling, (frames-start_times[rows])/sampling,
+                                 np.zeros(len(rows)), cells, event_numbers[rows],
+                                 rnd_nums[rows], characteristics[rows,4])).astype(float)
+    #activation ranks (by activation delays) within every event
+    rast_plot[:,2] = group_min_ranks(rast_plot[:,4], rast_plot[:,1])
+
+    lines = ['start_time act_delay act_rank cell event_num rnd_event_num rel_event_size']
+    for start_time, delay, rank, cell, event_num, rnd_num, size in rast_plot.tolist():
+        lines.append(f'{start_time} {delay} {rank} {int(cell)} {event_num} {rnd_num} {size}')
+    with open(f'{folder_path}/raster_plot.txt', 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines) + '\n')
+
+    cmap=plt.get_cmap('jet_r')
     vmin=np.amin(rast_plot[:,5])
     vmax=np.amax(rast_plot[:,5])
 
@@ -184,22 +205,23 @@ def cells_in_waves_analysis(CONFIG_DATA: dict, rast_plot: np.ndarray, pos: np.nd
     #creates array (N,3) array for results:
     # avg. act. rank, init. parameter, rel. participation number of cells
     results = np.zeros((cell_num, 3), float)
+    cells = rast_plot[:,3].astype(int)
+    participations = np.bincount(cells, minlength=cell_num)
 
-    #calculates results
-    for i in range(cell_num):
-        ##relative number of participations of cell
-        results[i,2] = len(rast_plot[np.where(rast_plot[:,3]==i)][:,3])/len(num_of_events)
+    ##relative number of participations of cell
+    results[:,2] = participations/len(num_of_events)
 
-        ##average activation rank of cell
-        results[i,0] = np.nanmean(rast_plot[np.where(rast_plot[:,3]==i)][:,2])
+    ##average activation rank of cell (nan for cells without participations)
+    rank_sums = np.bincount(cells, rast_plot[:,2], minlength=cell_num)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        results[:,0] = rank_sums/participations
 
-    initiator_perc_cutoff = [10] ##percentile cut-off for determination of initiator cells
+    initiator_perc_cutoff = 10 ##percentile cut-off for determination of initiator cells
 
-    for event in num_of_events:
-        event_data = rast_plot[np.where(rast_plot[:,4]==event)]
-        perc = np.percentile(event_data[:,2], initiator_perc_cutoff)
-        initiator_cells = np.array(event_data[np.where(event_data[:,2]<=perc[0])][:,3], int)
-        results[initiator_cells,1]+=1.0
+    events, percentiles = group_percentiles(rast_plot[:,4], rast_plot[:,2], initiator_perc_cutoff)
+    event_percentiles = percentiles[np.searchsorted(events, rast_plot[:,4])]
+    initiators = cells[rast_plot[:,2] <= event_percentiles]
+    results[:,1] = np.bincount(initiators, minlength=cell_num)
     #Precisions of output file (results array)
     precision = {
         'AvgRank': 2,
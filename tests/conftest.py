@@ -0,0 +1,7 @@
+"""
+Makes the analysis packages (helper_functions, methods) importable in tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+"""
+Tests of the cell activity parameters of all cells (against per-cell clusters)
+"""
+import numpy as np
+import pytest
+from helper_functions.cell_parameters import find_clusters, activity_parameters
+
+SAMPLING = 10.0
+INTERVAL_SECONDS = 60.0
+
+
+def cell_parameters(series: np.ndarray) -> tuple:
+    """
+    Activity parameters of one cell from its clusters of activity and inactivity
+    (IOIV of cells with at least 3 intervals of inactivity)
+    """
+    relative_active_time = np.sum(series)/len(series)
+    frequency, duration, ioiv = np.nan, np.nan, np.nan
+    activity_clusters = find_clusters(series)
+    if len(activity_clusters[1]) > 0:
+        frequency = len(activity_clusters[0])/INTERVAL_SECONDS
+        duration = np.average(activity_clusters[1])/SAMPLING
+    inactivity_clusters = find_clusters(series, trigger_val=0)
+    if len(inactivity_clusters[1]) > 2:
+        ioiv = (np.std(inactivity_clusters[1])/SAMPLING)/(np.average(inactivity_clusters[1])/SAMPLING)
+    return relative_active_time, frequency, duration, ioiv
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_activity_parameters_match_cells(seed):
+    rng = np.random.default_rng(seed)
+    binsig = (rng.random((600, 12)) < 0.3).astype(int)
+    binsig[:, 1] = 0
+    binsig[:, 2] = 1
+    #one and two intervals of inactivity
+    binsig[:, 3] = 0
+    binsig[100:200, 3] = 1
+    binsig[:, 4] = 1
+    binsig[100:200, 4] = 0
+    binsig[300:310, 4] = 0
+    parameters = activity_parameters(binsig, SAMPLING, INTERVAL_SECONDS)
+    expected = np.array([cell_parameters(binsig[:, cell]) for cell in range(binsig.shape[1])])
+    for column, key in enumerate(['relative_active_times', 'oscillation_frequencies',
+                                  'avg_oscillation_durations', 'interoscillation_int_var']):
+        np.testing.assert_allclose(parameters[key], expected[:, column], rtol=0, atol=1e-12)
+
+    assert parameters['relative_active_times'][1] == 0.0
+    assert np.isnan(parameters['oscillation_frequencies'][1])
+    assert np.isnan(parameters['avg_oscillation_durations'][1])
+    assert np.isnan(parameters['interoscillation_int_var'][1])
+    assert parameters['relative_active_times'][2] == 1.0
+    assert parameters['oscillation_frequencies'][2] == 1/INTERVAL_SECONDS
+    assert parameters['avg_oscillation_durations'][2] == len(binsig)/SAMPLING
+    assert np.isnan(parameters['interoscillation_int_var'][2])
@@ -0,0 +1,38 @@
+"""
+Tests of the coactivity matrix (against the pairwise cell loop)
+"""
+import numpy as np
+import pytest
+from helper_functions.coactivity import coactivity
+from helper_functions.packed_binary import PackedBinary
+
+
+def pairwise_coactivity(binsig: np.ndarray) -> np.ndarray:
+    """
+    Coactivity of all cell pairs counted pair by pair
+    """
+    cell_num = len(binsig[0])
+    ca_mat = np.zeros((cell_num, cell_num), float)
+    for i in range(cell_num):
+        ca_mat[i, i] = 1.0
+        for ii in range(i):
+            nact1 = np.sum(binsig[:, i])
+            nact2 = np.sum(binsig[:, ii])
+            nact = len(binsig[np.where((binsig[:, ii] == 1) & (binsig[:, i] == 1))])
+            if nact1 > 0 and nact2 > 0:
+                ca_mat[i][ii] = nact/np.sqrt(nact1*nact2)
+                ca_mat[ii][i] = ca_mat[i][ii]
+    return ca_mat
+
+
+@pytest.mark.parametrize('packed', [False, True])
+@pytest.mark.parametrize('block_size', [None, 3])
+@pytest.mark.parametrize('frames', [500, 1003])
+def test_coactivity_matches_pairs(frames, block_size, packed):
+    rng = np.random.default_rng(frames)
+    binsig = (rng.random((frames, 11)) < 0.2).astype(int)
+    binsig[:, 4] = 0
+    binsig[:, 7] = 1
+    data = PackedBinary.from_array(binsig) if packed else binsig
+    np.testing.assert_allclose(coactivity(data, block_size), pairwise_coactivity(binsig),
+                               rtol=0, atol=1e-15)
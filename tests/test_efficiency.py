@@ -0,0 +1,35 @@
+"""
+Tests of the global efficiency (against pairwise shortest path searches)
+"""
+import networkx as nx
+import pytest
+from helper_functions.network_funcs import efficiency
+
+
+def pairwise_efficiency(G: nx.Graph) -> float:
+    """
+    Global efficiency from shortest paths of all pairs i<j (disconnected pairs give 0)
+    """
+    avg = 0.0
+    n = len(G)
+    for i in range(n):
+        for j in range(i+1, n):
+            if nx.has_path(G, i, j):
+                avg += 1.0/nx.dijkstra_path_length(G, i, j)
+    return avg*2.0/(n*(n-1))
+
+
+GRAPHS = [
+    nx.watts_strogatz_graph(60, 6, 0.2, seed=1),
+    nx.barabasi_albert_graph(80, 3, seed=2),
+    #several components and isolated nodes
+    nx.gnp_random_graph(70, 0.03, seed=3),
+    nx.empty_graph(5)
+]
+
+
+@pytest.mark.parametrize('block_size', [7, 256])
+@pytest.mark.parametrize('G', GRAPHS)
+def test_efficiency_matches_pairwise_paths(G, block_size):
+    assert efficiency(G, block_size) == pairwise_efficiency(G)
+    assert efficiency(G, block_size) == pytest.approx(nx.global_efficiency(G), abs=1e-12)
@@ -0,0 +1,30 @@
+"""
+Tests of filtering all time series (columns) at once along the time axis
+"""
+import numpy as np
+import pytest
+from helper_functions.filters import FFTFilter
+
+
+def fft_filtered(signal: np.ndarray, time: list, low: float, high: float) -> np.ndarray:
+    """
+    Band-pass filtered signal (FFTFilter steps as in methods.filt_traces.filter_data)
+    """
+    signal_filter = FFTFilter(signal, time)
+    signal_filter.find_fftfreq()
+    signal_filter.rfft()
+    signal_filter.bandpass_filt(low, high)
+    return signal_filter.get_filtered_signal()
+
+
+@pytest.mark.parametrize('frames', [500, 501])
+def test_fft_filter_matrix_matches_columns(frames):
+    sampling = 10.0
+    rng = np.random.default_rng(frames)
+    time = [i/sampling for i in range(frames)]
+    data = rng.normal(0.0, 1.0, (frames, 6)) + np.sin(np.arange(frames)/7.0)[:, None]
+    filtered = fft_filtered(data, time, 0.03, 2.0)
+    expected = np.column_stack([fft_filtered(data[:, cell], time, 0.03, 2.0)
+                                for cell in range(data.shape[1])])
+    assert filtered.shape == data.shape
+    np.testing.assert_allclose(filtered, expected, rtol=0, atol=1e-12)
@@ -0,0 +1,35 @@
+"""
+Tests of the Louvain community detection (against helper_functions.community)
+"""
+import networkx as nx
+import numpy as np
+import pytest
+from helper_functions import community
+from helper_functions.louvain import louvain_communities
+
+GRAPHS = [
+    nx.watts_strogatz_graph(60, 6, 0.2, seed=1),
+    nx.barabasi_albert_graph(80, 3, seed=2),
+    nx.gnp_random_graph(70, 0.05, seed=3)
+]
+
+
+@pytest.mark.parametrize('G', GRAPHS)
+def test_first_run_matches_best_partition(G):
+    expected = community.best_partition(G)
+    partition, Q = louvain_communities(G)
+    assert partition.tolist() == [expected[node] for node in range(len(G))]
+    assert Q == pytest.approx(community.modularity(expected, G), abs=1e-12)
+
+
+@pytest.mark.parametrize('G', GRAPHS)
+def test_restarts_with_workers(G):
+    first, first_Q = louvain_communities(G)
+    partition, Q = louvain_communities(G, restarts=4, seed=5, num_workers=1)
+    parallel_partition, parallel_Q = louvain_communities(G, restarts=4, seed=5, num_workers=2)
+    assert np.array_equal(partition, parallel_partition)
+    assert Q == parallel_Q
+    assert Q >= first_Q
+    assert Q == pytest.approx(community.modularity(dict(enumerate(partition.tolist())), G), abs=1e-12)
+    if Q == first_Q:
+        assert np.array_equal(partition, first)
@@ -0,0 +1,43 @@
+"""
+Tests of the per-node network parameters (against networkx)
+"""
+import networkx as nx
+import numpy as np
+import pytest
+from helper_functions.node_metrics import node_metrics
+
+GRAPHS = [
+    nx.watts_strogatz_graph(60, 6, 0.2, seed=1),
+    nx.barabasi_albert_graph(80, 3, seed=2),
+    #several components and isolated nodes
+    nx.gnp_random_graph(70, 0.03, seed=3),
+    #more sources than one block of breadth-first searches
+    nx.watts_strogatz_graph(300, 4, 0.1, seed=4)
+]
+
+
+def hindex(G: nx.Graph, node: int) -> int:
+    """
+    H-index of node (largest h with h neighbours of degree at least h)
+    """
+    degrees = sorted((G.degree(v) for v in G.neighbors(node)), reverse=True)
+    return sum(1 for i, degree in enumerate(degrees) if degree >= i+1)
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+@pytest.mark.parametrize('G', GRAPHS)
+def test_node_metrics_match_networkx(G, num_workers):
+    nodes = range(len(G))
+    metrics = node_metrics(G, num_workers)
+    closeness = nx.closeness_centrality(G)
+    betweenness = nx.betweenness_centrality(G)
+    degree_centrality = nx.degree_centrality(G)
+    avg_nn_degree = nx.average_neighbor_degree(G)
+    clustering = nx.clustering(G)
+    assert metrics['k'].tolist() == [G.degree(i) for i in nodes]
+    assert metrics['Hindex'].tolist() == [hindex(G, i) for i in nodes]
+    np.testing.assert_allclose(metrics['CloseCent'], [closeness[i] for i in nodes], atol=1e-12)
+    np.testing.assert_allclose(metrics['BetwCent'], [betweenness[i] for i in nodes], atol=1e-12)
+    np.testing.assert_allclose(metrics['DegCent'], [degree_centrality[i] for i in nodes], atol=1e-12)
+    np.testing.assert_allclose(metrics['AvgNNDeg'], [avg_nn_degree[i] for i in nodes], atol=1e-12)
+    np.testing.assert_allclose(metrics['C'], [clustering[i] for i in nodes], atol=1e-12)
@@ -0,0 +1,40 @@
+"""
+Tests of the bit-packed container of binarized time series
+"""
+import numpy as np
+from helper_functions.packed_binary import PackedBinary
+
+
+class RecordingArray(np.ndarray):
+    """
+    Array that records the shapes of all arrays read from it by indexing
+    """
+    reads = []
+
+    def __getitem__(self, key):
+        values = super().__getitem__(key)
+        RecordingArray.reads.append(np.shape(values))
+        return values
+
+
+def test_packed_indexing_matches_dense():
+    rng = np.random.default_rng(7)
+    binsig = (rng.random((203, 11)) < 0.3).astype(int)
+    packed = PackedBinary.from_array(binsig)
+    assert np.array_equal(packed.unpack(), binsig)
+    assert np.array_equal(packed[:, 4], binsig[:, 4])
+    assert np.array_equal(packed[5:150:3, [9, 2, 2]], binsig[5:150:3][:, [9, 2, 2]])
+    assert np.array_equal(packed[[0, 202], :], binsig[[0, 202], :])
+    assert packed[17, 3] == binsig[17, 3]
+    assert packed[17, 3].shape == ()
+
+
+def test_column_read_does_not_read_all_cells():
+    rng = np.random.default_rng(8)
+    binsig = (rng.random((1000, 300)) < 0.2).astype(int)
+    packed = PackedBinary.from_array(binsig)
+    packed.packed = packed.packed.view(RecordingArray)
+    RecordingArray.reads = []
+    assert np.array_equal(packed[:, 123], binsig[:, 123])
+    assert RecordingArray.reads
+    assert max(shape[-1] for shape in RecordingArray.reads) == 1
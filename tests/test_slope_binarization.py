@@ -0,0 +1,61 @@
+"""
+Tests of the vectorized slope binarization (against the original per-cell loop)
+"""
+import copy
+import numpy as np
+import pytest
+from helper_functions.utility_functions import SAMPLE_CONFIG_DATA
+from methods.bin_traces_old import signal_binarization, fast_signal_binarization
+
+
+def oscillating_traces(frames: int, cells: int, seed: int) -> np.ndarray:
+    """
+    Seeded synthetic calcium traces (square oscillations with drift and noise)
+    """
+    rng = np.random.default_rng(seed)
+    time = np.arange(frames)/10.0
+    data = np.zeros((frames, cells))
+    for cell in range(cells):
+        period = rng.uniform(8, 15)
+        phase = rng.uniform(0, period)
+        oscillation = (np.sin(2*np.pi*(time+phase)/period) > 0.3).astype(float)
+        data[:, cell] = (oscillation*rng.uniform(0.5, 2) + 0.01*time +
+                         rng.normal(0, 0.15, frames) + 5)
+    return data
+
+
+def config(num_workers: int) -> dict:
+    """
+    Configuration without figures and text exports
+    """
+    config_data = copy.deepcopy(SAMPLE_CONFIG_DATA)
+    config_data.update(EXPERIMENT_NAME='test_slope_binarization', NUM_WORKERS=num_workers,
+                       CELL_FIGURES='none', EXPORT_TEXT_FILES=False,
+                       INTERVAL_START_TIME_SECONDS=10, INTERVAL_END_TIME_SECONDS=60)
+    return config_data
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_fast_binarization_matches_loop(tmp_path, monkeypatch, num_workers):
+    monkeypatch.chdir(tmp_path)
+    data = oscillating_traces(1500, 10, seed=num_workers)
+    pos = np.random.default_rng(0).uniform(0, 100, (10, 2))
+    expected = signal_binarization(config(1), data.copy(), pos)
+    binsig = fast_signal_binarization(config(num_workers), data.copy(), pos)
+    assert expected.any()
+    assert np.array_equal(binsig, expected)
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_cell_without_onsets(tmp_path, monkeypatch, num_workers):
+    monkeypatch.chdir(tmp_path)
+    data = oscillating_traces(1500, 4, seed=3)
+    #decreasing trace has no positive slopes (no oscillation onsets)
+    data[:, 2] = np.linspace(5.0, 1.0, len(data))
+    pos = np.random.default_rng(1).uniform(0, 100, (4, 2))
+    with pytest.raises(IndexError):
+        signal_binarization(config(1), data.copy(), pos)
+    binsig = fast_signal_binarization(config(num_workers), data.copy(), pos)
+    assert not binsig[:, 2].any()
+    expected = signal_binarization(config(1), data[:, [0, 1, 3]].copy(), pos[[0, 1, 3]])
+    assert np.array_equal(binsig[:, [0, 1, 3]], expected)
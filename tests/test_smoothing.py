@@ -0,0 +1,31 @@
+"""
+Tests of the vectorized (cumulative sum) moving average smoothing
+"""
+import numpy as np
+import pytest
+from helper_functions.smoothing import smooth_ts, smooth_ts_matrix
+
+
+@pytest.mark.parametrize('num_points, runs', [(1, 1), (2, 1), (3, 2), (5, 3), (10, 2), (25, 1)])
+def test_smooth_ts_matrix_matches_smooth_ts(num_points, runs):
+    rng = np.random.default_rng(num_points*10 + runs)
+    data = rng.normal(5.0, 1.0, (300, 7))
+    smoothed = smooth_ts_matrix(data, num_points, runs)
+    expected = np.column_stack([smooth_ts(data[:, cell], num_points, runs)
+                                for cell in range(data.shape[1])])
+    assert smoothed.shape == data.shape
+    np.testing.assert_allclose(smoothed, expected, rtol=0, atol=1e-10)
+
+
+def test_smooth_ts_matrix_one_dimensional():
+    data = np.sin(np.linspace(0, 20, 200))
+    np.testing.assert_allclose(smooth_ts_matrix(data, 4, 2), smooth_ts(data, 4, 2),
+                               rtol=0, atol=1e-10)
+
+
+def test_smooth_ts_matrix_long_series():
+    rng = np.random.default_rng(0)
+    data = rng.random((36000, 2)) + 100.0
+    smoothed = smooth_ts_matrix(data, 100, 2)
+    expected = smooth_ts(data[:, 1], 100, 2)
+    np.testing.assert_allclose(smoothed[:, 1], expected, rtol=0, atol=1e-9)
@@ -0,0 +1,201 @@
+"""
+Regression tests of wave detection (batch and streaming) against the original per-frame algorithm
+"""
+import copy
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.spatial import distance
+from scipy.stats import rankdata
+from helper_functions.utility_functions import SAMPLE_CONFIG_DATA
+from helper_functions.packed_binary import PackedBinary
+from helper_functions.wave_tracking import frame_chunks
+from methods.wave_detection import (wave_detection, wave_detection_streaming, wave_characterization,
+                                    wave_raster_plot, cells_in_waves_analysis)
+
+SAMPLING = 10.0
+FRAME_TH = 5
+DISTANCE_TH = 25.0
+SIZE_TH = 0.1
+
+
+def reference_act_sig(binsig: np.ndarray, pos: np.ndarray) -> np.ndarray:
+    """
+    Original per-frame wave detection (labels of cells in waves)
+    """
+    distances = distance.cdist(pos, pos, 'euclidean')
+    neighbours = [np.where((distances[:, i] < DISTANCE_TH) & (distances[:, i] != 0))[0]
+                  for i in range(len(pos))]
+    nonzero_lines = np.where(binsig == 1)[0]
+    active = {line: list(np.where(binsig[line, :] == 1)[0]) for line in nonzero_lines}
+    act_sig = np.zeros(binsig.shape, int)
+    event_nums = []
+    max_event_number = 0
+    for i, frame in enumerate(active):
+        k = max_event_number + 1
+        cells = active[frame]
+        if i == 0:
+            act_sig[frame, cells] = [k+j for j in range(len(cells))]
+            for cell_i in cells:
+                for cell_j in list(set(neighbours[cell_i]).intersection(set(cells))):
+                    act_sig[frame, cell_i] = min(act_sig[frame, cell_i], act_sig[frame, cell_j])
+                    act_sig[frame, cell_j] = act_sig[frame, cell_i]
+        else:
+            act_sig[frame, cells] = [k+i if act_sig[frame-1, cell] == 0 else act_sig[frame-1, cell]
+                                     for cell in cells]
+            for cell_i in cells:
+                for cell_j in list(set(neighbours[cell_i]).intersection(set(cells))):
+                    new_i, new_j = act_sig[frame, cell_i], act_sig[frame, cell_j]
+                    old_i, old_j = act_sig[frame-1, cell_i], act_sig[frame-1, cell_j]
+                    if (new_i != 0 and new_j != 0 and old_i != 0 and old_j == 0 and cell_i != cell_j
+                            and np.sum(binsig[frame-FRAME_TH:frame+1, cell_i]) <= FRAME_TH):
+                        act_sig[frame, cell_j] = act_sig[frame, cell_i]
+                    elif (new_i != 0 and new_j != 0 and old_i == 0 and old_j != 0 and cell_i != cell_j
+                          and np.sum(binsig[frame-FRAME_TH:frame+1, cell_j]) <= FRAME_TH):
+                        act_sig[frame, cell_i] = act_sig[frame, cell_j]
+                    elif new_i != 0 and new_j != 0 and old_i == 0 and old_j == 0 and cell_i != cell_j:
+                        act_sig[frame, cell_i] = min(act_sig[frame, cell_i], act_sig[frame, cell_j])
+                        act_sig[frame, cell_j] = act_sig[frame, cell_i]
+        event_nums = list(set(event_nums).union(set(np.unique(act_sig[frame, :]))))
+        max_event_number = max(event_nums)
+    for i, event_num in enumerate(np.unique(act_sig[act_sig != 0])):
+        act_sig[np.where(act_sig == event_num)] = i+1
+    return act_sig
+
+
+def reference_characteristics(act_sig: np.ndarray) -> tuple:
+    """
+    Original wave characterization (characteristics and events_parameters.txt lines)
+    """
+    cell_num = len(act_sig[0])
+    characteristics = np.zeros((0, 6), float)
+    lines = ['start_frame end_frame duration event_number act_cell_num rel_act_cell_num']
+    for kkk, event in enumerate(int(e) for e in np.unique(act_sig[act_sig != 0])):
+        frames, cells = np.where(act_sig == event)
+        act_cell_num = len(np.unique(cells))
+        start_frame, end_frame = np.amin(frames), np.amax(frames)
+        if act_cell_num/cell_num > SIZE_TH:
+            lines.append(' '.join(str(value) for value in (start_frame, end_frame, end_frame-start_frame,
+                                                           kkk+1, act_cell_num, act_cell_num/cell_num)))
+            characteristics = np.vstack((characteristics, [start_frame, end_frame, end_frame-start_frame,
+                                                           event, act_cell_num, act_cell_num/cell_num]))
+    return characteristics, lines
+
+
+def reference_raster_plot(act_sig: np.ndarray, characteristics: np.ndarray) -> tuple:
+    """
+    Original raster plot (rows and raster_plot.txt lines)
+    """
+    rast_plot = []
+    for kkk in range(len(characteristics)):
+        start_time, end_time = int(characteristics[kkk, 0]), int(characteristics[kkk, 1])
+        event_num = int(characteristics[kkk, 3])
+        rnd_num = np.random.randint(1, 600)
+        used = []
+        for i in range(start_time, end_time+1):
+            for j in range(len(act_sig[0])):
+                if act_sig[i, j] == event_num and j not in used:
+                    rast_plot.append((i/SAMPLING, (i-start_time)/SAMPLING, 0, j, event_num, rnd_num,
+                                      characteristics[kkk, 4]))
+                    used.append(j)
+    rast_plot = np.array(rast_plot, float)
+    for event_num in np.unique(rast_plot[:, 4]):
+        rows = np.where(rast_plot[:, 4] == event_num)[0]
+        rast_plot[rows, 2] = rankdata(rast_plot[rows, 1], 'min')
+    lines = ['start_time act_delay act_rank cell event_num rnd_event_num rel_event_size']
+    for row in rast_plot:
+        lines.append(' '.join(str(value) for value in (row[0], row[1], row[2], int(row[3]),
+                                                       row[4], row[5], row[6])))
+    return rast_plot, lines
+
+
+def reference_cell_parameters(rast_plot: np.ndarray, cell_num: int) -> str:
+    """
+    Original cell roles in waves (cell_wave_parameters.txt)
+    """
+    num_of_events = np.unique(rast_plot[:, 4])
+    results = np.zeros((cell_num, 3), float)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for i in range(cell_num):
+            results[i, 2] = len(rast_plot[np.where(rast_plot[:, 3] == i)][:, 3])/len(num_of_events)
+            results[i, 0] = np.nanmean(rast_plot[np.where(rast_plot[:, 3] == i)][:, 2])
+    for event in num_of_events:
+        event_data = rast_plot[np.where(rast_plot[:, 4] == event)]
+        perc = np.percentile(event_data[:, 2], [10])
+        results[np.array(event_data[np.where(event_data[:, 2] <= perc[0])][:, 3], int), 1] += 1.0
+    results = pd.DataFrame(results, columns=['AvgRank', 'InitParameter', 'RelParticipation'])
+    for col, value in {'AvgRank': 2, 'InitParameter': 0, 'RelParticipation': 2}.items():
+        results[col] = results[col].round(value)
+    return results.to_csv(sep=' ', index=False)
+
+
+def wave_recording(seed: int) -> tuple:
+    """
+    Seeded binarized recording with waves propagating along x and random activity
+    """
+    rng = np.random.default_rng(seed)
+    cell_num, frame_num = 40, 400
+    pos = rng.uniform(0, 100, (cell_num, 2))
+    binsig = (rng.random((frame_num, cell_num)) < 0.02).astype(int)
+    for cell in range(cell_num):
+        for start in range(int(pos[cell, 0]/10)+int(rng.integers(0, 3)), frame_num, 60):
+            binsig[start:start+int(rng.integers(2, 15)), cell] = 1
+    return binsig, pos
+
+
+def config() -> dict:
+    """
+    Wave detection configuration of the tests
+    """
+    config_data = copy.deepcopy(SAMPLE_CONFIG_DATA)
+    config_data.update(EXPERIMENT_NAME='test_waves', SAMPLING=SAMPLING, COORDINATE_TRANSFORM=1.0)
+    config_data['WAVES'].update(TIME_TH_SECONDS=FRAME_TH/SAMPLING, DISTANCE_TH=DISTANCE_TH,
+                                REL_SIZE_THRESHOLD=SIZE_TH)
+    return config_data
+
+
+def read_output(name: str) -> str:
+    """
+    Contents of an output file of the wave analysis
+    """
+    with open(f'results/test_waves/waves/{name}', encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_waves_match_per_frame_algorithm(tmp_path, monkeypatch, seed):
+    monkeypatch.chdir(tmp_path)
+    binsig, pos = wave_recording(seed)
+    expected_act_sig = reference_act_sig(binsig, pos)
+    expected_characteristics, expected_events = reference_characteristics(expected_act_sig)
+    np.random.seed(seed)
+    expected_raster, expected_raster_lines = reference_raster_plot(expected_act_sig,
+                                                                   expected_characteristics)
+    expected_cells = reference_cell_parameters(expected_raster, len(pos))
+    assert len(expected_characteristics) > 1
+
+    act_sig = wave_detection(config(), PackedBinary.from_array(binsig), pos)
+    assert np.array_equal(act_sig, expected_act_sig)
+    characteristics = wave_characterization(config(), act_sig)
+    assert np.array_equal(characteristics, expected_characteristics)
+    assert read_output('events_parameters.txt').splitlines() == expected_events
+    np.random.seed(seed)
+    rast_plot = wave_raster_plot(config(), act_sig, characteristics)
+    assert read_output('raster_plot.txt').splitlines() == expected_raster_lines
+    cells_in_waves_analysis(config(), rast_plot, pos)
+    assert read_output('cell_wave_parameters.txt') == expected_cells
+    act_sig_text = read_output('act_sig.txt')
+
+    for chunk_frames in [137, 1]:
+        chunks = frame_chunks(PackedBinary.from_array(binsig), chunk_frames)
+        characteristics, activations = wave_detection_streaming(config(), chunks, pos, len(binsig))
+        assert read_output('act_sig.txt') == act_sig_text
+        assert read_output('events_parameters.txt').splitlines() == expected_events
+        assert np.array_equal(characteristics, expected_characteristics)
+        np.random.seed(seed)
+        rast_plot = wave_raster_plot(config(), None, characteristics, activations)
+        assert read_output('raster_plot.txt').splitlines() == expected_raster_lines
+        cells_in_waves_analysis(config(), rast_plot, pos)
+        assert read_output('cell_wave_parameters.txt') == expected_cells